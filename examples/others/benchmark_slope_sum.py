@@ -0,0 +1,69 @@
+"""
+Benchmark of the slope sum PPG detector
+=======================================
+
+Compares PeakDetector.detect_peak_trough_slope_sum with the previous
+implementation, which summed the slope over a window with a nested Python
+loop. The previous implementation is reproduced below with the
+search_for_onset call fixed, onsets clamped at 0 and shifted to signal
+samples, so both return the same peaks and onsets.
+"""
+import time
+import numpy as np
+from vital_sqi.common.rpeak_detection import PeakDetector
+
+
+def slope_sum_loop(s, fs=100):
+    w = 12
+    N = len(s)
+    Z = []
+    for n in range(w + 1, N):
+        Zk = 0
+        for k in range((n - w), n):
+            delta_y_k = s[k] - s[k - 1]
+            Zk = Zk + max(0, delta_y_k)
+        Z.append(Zk)
+    Z = np.array(Z)
+
+    threshold_base = 3 * np.mean(Z[:10 * fs])
+    onset_list = []
+    for n in range(len(Z)):
+        if Z[n] > threshold_base * 0.6:
+            left = max(n - 15, 0)
+            right = min(n + 15, len(Z))
+            local_min = np.min(Z[left:right])
+            local_max = np.max(Z[left:right])
+            if (local_max - local_min) > local_min * 2:
+                idx = n
+                while Z[idx] > 0:
+                    idx = idx - 1
+                    if idx <= 0:
+                        break
+                onset_list.append(0 if idx <= 0 else idx + 1)
+            threshold_base = local_max
+    onset_list = np.unique(onset_list) + w - 1
+    peak_list = [np.argmax(s[left:right]) + left
+                 for left, right in zip(onset_list[:-1], onset_list[1:])]
+    return np.array(peak_list), onset_list
+
+
+fs = 100
+t = np.arange(0, 300, 1 / fs)
+rng = np.random.default_rng(0)
+s = np.sin(2 * np.pi * 1.2 * t) + 0.5 * np.sin(2 * np.pi * 2.4 * t - 1) \
+    + 0.05 * rng.normal(size=len(t))
+detector = PeakDetector(fs=fs)
+
+start = time.perf_counter()
+expected = slope_sum_loop(s, fs)
+loop_time = time.perf_counter() - start
+
+start = time.perf_counter()
+result = detector.detect_peak_trough_slope_sum(s)
+vectorized_time = time.perf_counter() - start
+
+assert np.array_equal(result[0], expected[0])
+assert np.array_equal(result[1], expected[1])
+print("{0} samples: loop {1:.3f} s, vectorized {2:.4f} s, "
+      "speedup x{3:.0f}".format(len(s), loop_time, vectorized_time,
+                                loop_time / vectorized_time))
@@ -17,8 +17,7 @@ setup(
     maintainer = 'Hai Ho, Khoa Le',
     maintainer_email = 'haihb@oucru.org, khoaldv@oucru.org',
     py_modules = ['common', 'data', 'preprocess', 'sqi'],
-    install_requires = ['dtw-python>=1.1.6',
-                        'heartpy>=1.2.6',
+    install_requires = ['heartpy>=1.2.6',
                         'pmdarima>=1.8.0',
                         'hrv-analysis>=1.0.3',
                         'matplotlib>=3.3.3',
@@ -33,9 +32,11 @@ setup(
                         'pyEDFlib>=0.1.20',
                         'pycwt>=0.3.0a22',
                         'wfdb>=3.3.0',
-                        'datetimerange>=1.0.0',
                         'dateparser>=1.0.0',
                         'openpyxl>=3.0.7'],
+    # dtw-python is the reference the tests check dtw_sqi against
+    extras_require = {'test': ['dtw-python>=1.1.6',
+                               'pytest']},
     python_requires = '>=3.7',
     zip_safe = False,
     url = 'https://github.com/meta00/vital_sqi',
@@ -9,6 +9,8 @@ from scipy.signal import argrelextrema
 import plotly.io as pio
 from scipy.integrate import solve_ivp
 from vital_sqi.preprocess.preprocess_signal import squeeze_template
+from vital_sqi.common.generate_template import rr_process, \
+    ecg_dynamic_template
 
 class TestPPGDualDoubleFrequencyTemplate(object):
     def test_on_ppg_dual_double_frequency_template(self):
@@ -28,10 +30,26 @@ class TestInterp(object):
 
 class TestECGDynamicTemplate(object):
     def test_on_ecg_dynamic_template(self):
-        pass
+        template = ecg_dynamic_template(100, seed=0)
+        assert len(template) == 100
+        assert np.array_equal(template, ecg_dynamic_template(100, seed=0))
+        # one second at 60 bpm holds a single R peak, the highest point
+        peaks = signal.find_peaks(template,
+                                  prominence=0.5 * np.ptp(template))[0]
+        assert len(peaks) == 1
+        # the same second sampled at another rate
+        dense = ecg_dynamic_template(400, seed=0)
+        assert np.allclose(dense[::4], template, atol=1e-3 * np.ptp(dense))
 class TestOrdinaryDifferentialEquation(object):
     def test_on_ordinary_differential_equation(self):
         pass
 class TestRRProcess(object):
     def test_on_rr_process(self):
-        pass
\ No newline at end of file
+        args = (0.1, 0.25, 0.01, 0.01, 0.5, 60, 1, 1, 256)
+        rr = rr_process(*args, seed=1)
+        assert np.allclose(rr, rr_process(*args, seed=1))
+        assert not np.allclose(rr, rr_process(*args, seed=2))
+        # same phases as seeding the global random state
+        np.random.seed(1)
+        assert np.allclose(rr, rr_process(*args))
+        assert np.isclose(np.mean(rr), 1) and np.isclose(np.std(rr), 1 / 60)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+import time
 import pytest
 import numpy as np
 from sklearn.cluster import KMeans
@@ -5,10 +7,39 @@ from scipy import signal
 
 from vital_sqi.preprocess.band_filter import BandpassFilter
 from vital_sqi.common.generate_template import ecg_dynamic_template
-from vital_sqi.common.rpeak_detection import PeakDetector
+from vital_sqi.common.rpeak_detection import PeakDetector, \
+    StreamingPeakDetector, StreamingMatchedFilterDetector, \
+    _segment_argmax, _segment_argmin, _billauer, _two_means, \
+    BILLAUER_METHOD, TEMPLATE_CACHE
 import warnings
 from ecgdetectors import Detectors,panPeakDetect
 
+
+def synthetic_ppg(fs, duration=30, heart_rate=1.2):
+    t = np.arange(0, duration, 1 / fs)
+    return np.sin(2 * np.pi * heart_rate * t) + \
+        0.5 * np.sin(2 * np.pi * 2 * heart_rate * t - 1)
+
+
+def synthetic_ecg(fs, duration=30, seed=0):
+    rng = np.random.default_rng(seed)
+    beat = ecg_dynamic_template(fs, seed=1)
+    onsets = np.cumsum(np.round(rng.normal(1, 0.1, 2 * duration) * fs))
+    s = np.zeros((duration + 2) * fs)
+    for onset in onsets[onsets < duration * fs].astype(int):
+        s[onset:onset + fs] += beat
+    s = s[:duration * fs]
+    return s + rng.normal(0, 0.05, len(s))
+
+
+def matched_filter_reference(s, fs, template):
+    sos = signal.butter(4, [0.2 / fs, 96 / fs], btype='bandpass',
+                        output='sos')
+    detection = signal.lfilter(template[::-1], 1, signal.sosfilt(sos, s))
+    squared = detection * detection
+    squared[:len(template)] = 0
+    return panPeakDetect(squared, fs)
+
 class TestPeakDetector(object):
     def test_on_init(self):
         detector = PeakDetector()
@@ -19,14 +50,84 @@ class TestECGDetector(object):
         detector = PeakDetector()
         pass
 
+class TestMultiLeadECGDetector(object):
+    def test_on_ecg_detector_multilead(self):
+        fs = 250
+        rng = np.random.default_rng(0)
+        s = synthetic_ecg(fs, 30)
+        signals = np.stack([gain * s + rng.normal(0, 0.02, len(s))
+                            for gain in [1, 0.8, 1.2]], axis=1)
+        detector = PeakDetector(wave_type='ecg', fs=fs)
+        expected = [detector.ecg_detector(signals[:, i]) for i in range(3)]
+        for executor in ['thread', 'process']:
+            lead_peaks = detector.ecg_detector_multilead(
+                signals, n_workers=3, executor=executor)
+            assert len(lead_peaks) == 3
+            for peaks, lead_expected in zip(lead_peaks, expected):
+                assert np.array_equal(peaks, lead_expected)
+        lead_peaks = detector.ecg_detector_multilead(
+            signals.T, 'mtemp', channel_axis=0, n_workers=0)
+        assert np.array_equal(lead_peaks[1],
+                              detector.ecg_detector(signals[:, 1], 'mtemp'))
+        single = detector.ecg_detector_multilead(s)
+        assert len(single) == 1
+        assert np.array_equal(single[0], detector.ecg_detector(s))
+        fused = detector.ecg_detector_multilead(
+            np.stack([s, s], axis=1), consensus=True)
+        assert np.array_equal(fused, single[0])
+        with pytest.raises(AssertionError) as exc_info:
+            detector.ecg_detector_multilead(signals, executor='gpu')
+        assert exc_info.match('Unsupported executor')
+
+    @pytest.mark.skipif((os.cpu_count() or 1) < 4,
+                        reason='needs 4 CPUs to run 4 leads in parallel')
+    def test_on_multilead_speedup(self):
+        fs = 250
+        s = synthetic_ecg(fs, 300)
+        signals = np.stack([s] * 4, axis=1)
+        detector = PeakDetector(wave_type='ecg', fs=fs)
+        start = time.perf_counter()
+        serial = detector.ecg_detector_multilead(signals, n_workers=1)
+        serial_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = detector.ecg_detector_multilead(signals, n_workers=4)
+        parallel_time = time.perf_counter() - start
+        for peaks, expected in zip(parallel, serial):
+            assert np.array_equal(peaks, expected)
+        # about the wall time of one lead, with the pool start-up
+        assert parallel_time < 0.6 * serial_time
+
+    def test_on_consensus_peaks(self):
+        detector = PeakDetector(wave_type='ecg', fs=100)
+        lead_peaks = [[100, 300, 500], [102, 299, 505], [700]]
+        assert np.array_equal(detector.consensus_peaks(lead_peaks),
+                              [101, 300, 502])
+        assert np.array_equal(
+            detector.consensus_peaks(lead_peaks, min_leads=1),
+            [101, 300, 502, 700])
+        assert np.array_equal(
+            detector.consensus_peaks(lead_peaks, tolerance=0.01), [300])
+        assert len(detector.consensus_peaks([[], []])) == 0
+
+
 class TestPPGDetector(object):
     def test_on_ppg_detector(self):
         detector = PeakDetector()
         pass
 
     def test_on_matched_filter_detector(self):
-        detector = PeakDetector()
-        pass
+        for fs in [128, 250, 360]:
+            s = synthetic_ecg(fs, 60, seed=fs)
+            detector = PeakDetector(wave_type='ecg', fs=fs)
+            peaks = detector.matched_filter_detector(s)
+            template = TEMPLATE_CACHE.get(3, fs)
+            assert np.array_equal(peaks,
+                                  matched_filter_reference(s, fs, template))
+            assert len(peaks) > 50
+            assert np.array_equal(
+                detector.matched_filter_detector(s, chunk_size=fs // 3),
+                peaks)
+            assert np.array_equal(detector.ecg_detector(s, 'mtemp'), peaks)
 
     def test_on_compute_feature(self):
         detector = PeakDetector()
@@ -34,24 +135,247 @@ class TestPPGDetector(object):
 
     def test_on_detect_peak_trough_clusterer(self):
         detector = PeakDetector()
-        pass
+        s = synthetic_ppg(100)
+        peaks, troughs = detector.detect_peak_trough_clusterer(s)
+        assert np.array_equal(peaks, signal.argrelmax(s)[0][::2])
+        assert np.allclose(s[troughs], s.min(), atol=0.01)
+        peaks, troughs = detector.detect_peak_trough_clusterer(np.zeros(10))
+        assert len(peaks) == 0 and len(troughs) == 0
+        with pytest.raises(AssertionError) as exc_info:
+            detector.detect_peak_trough_clusterer(s, clusterer='dbscan')
+        assert exc_info.match('Unsupported clusterer')
+
+    def test_on_two_means(self):
+        rng = np.random.default_rng(0)
+        X = np.vstack((rng.normal(0, 0.1, (20, 2)),
+                       rng.normal(5, 0.1, (30, 2))))
+        labels = _two_means(X)
+        assert np.array_equal(labels, [0] * 20 + [1] * 30)
+        expected = KMeans(n_clusters=2, n_init=10, random_state=0).fit(X)
+        assert len(np.unique(labels * 2 + expected.labels_)) == 2
+        assert np.array_equal(_two_means(np.ones((5, 2))), np.zeros(5))
+
+    def test_on_two_means_small_amplitude(self):
+        # tol is relative to the spread of the features
+        detector = PeakDetector()
+        rng = np.random.default_rng(0)
+        for k in range(10):
+            s = synthetic_ppg(100, 30, rng.uniform(0.8, 2)) + \
+                rng.normal(0, 0.05, 3000)
+            for scale in [1, 1e-3]:
+                X = detector.compute_feature(scale * s,
+                                             signal.argrelmax(s)[0])
+                labels = _two_means(X)
+                expected = KMeans(n_clusters=2, n_init=10,
+                                  random_state=k).fit(X)
+                assert len(np.unique(labels * 2 + expected.labels_)) == 2
+
+    def test_on_two_means_noise(self):
+        # no worse a local optimum than KMeans
+        detector = PeakDetector()
+        rng = np.random.default_rng(0)
+        for k in range(10):
+            s = rng.normal(0, 1e-3, 3000)
+            X = detector.compute_feature(s, signal.argrelmax(s)[0])
+            labels = _two_means(X)
+            inertia = sum(np.sum((X[labels == i] - X[labels == i].mean(
+                axis=0)) ** 2) for i in range(2))
+            expected = KMeans(n_clusters=2, n_init=10, random_state=k).fit(X)
+            assert inertia <= expected.inertia_ * (1 + 1e-3)
 
     def test_on_detect_peak_trough_count_orig(self):
         detector = PeakDetector()
-        pass
+        s = synthetic_ppg(100)
+        peaks, troughs = detector.detect_peak_trough_count_orig(s)
+        assert np.allclose(np.diff(peaks), 100 / 1.2, atol=1)
+        assert np.all(s[peaks] > 1)
+        assert len(troughs) == len(peaks) + 1
+        assert np.all(troughs[:-1] < peaks) and np.all(peaks < troughs[1:])
+        # troughs with no peak in between keep the lowest one
+        s = np.array([0, -1, 0, -3, 0, -2, 5, -1, 0, -4, 3, -2, 0])
+        peaks, troughs = detector.detect_peak_trough_count_orig(s)
+        assert list(peaks) == [6, 10]
+        assert list(troughs) == [3, 9, 11]
+        peaks, troughs = detector.detect_peak_trough_count_orig(np.ones(10))
+        assert len(peaks) == 0 and len(troughs) == 0
 
     def test_on_detect_peak_trough_slope_sum(self):
-        detector = PeakDetector()
-        pass
+        for fs in [100, 250]:
+            detector = PeakDetector(fs=fs)
+            s = synthetic_ppg(fs)
+            peaks, onsets = detector.detect_peak_trough_slope_sum(s)
+            assert len(peaks) == len(onsets) - 1
+            assert np.all(np.diff(onsets) > 0)
+            # one beat per period, peaks at the local maxima of the signal
+            assert np.allclose(np.diff(peaks), fs / 1.2, atol=1)
+            assert np.all(s[peaks] > 1)
+        peaks, onsets = PeakDetector().detect_peak_trough_slope_sum(
+            np.zeros(5))
+        assert len(peaks) == 0 and len(onsets) == 0
 
     def test_on_search_for_onset(self):
         detector = PeakDetector()
-        pass
+        Z = np.array([0, 1, 0, 2, 3, 4])
+        assert detector.search_for_onset(Z, 5, 4) == 3
+        assert detector.search_for_onset(Z, 1, 4) == 0
+
+    def test_on_segment_argmax(self):
+        s = np.array([3, 1, 4, 1, 5, 9, 2, 6, 5, 3], dtype=float)
+        starts = np.array([0, 2, 6])
+        ends = np.array([2, 5, 10])
+        assert list(_segment_argmax(s, starts, ends)) == [0, 4, 7]
+        assert list(_segment_argmin(s, starts, ends)) == [1, 3, 6]
+        assert len(_segment_argmax(s, [], [])) == 0
 
     def test_on_get_moving_average(self):
         detector = PeakDetector()
-        pass
+        out = detector.get_moving_average(np.arange(10.0), 3)
+        assert np.allclose(out, [1 / 3] + list(range(1, 9)) + [26 / 3])
+        batch = detector.get_moving_average(np.tile(np.arange(10.0), (2, 1)),
+                                            3, axis=1)
+        assert np.allclose(batch, [out, out])
+
+    def test_on_get_ROI(self):
+        detector = PeakDetector()
+        s = np.array([0, 2, 0, 2, 2, 0, 2, 2, 2])
+        starts, ends = detector.get_ROI(s, np.ones(9))
+        assert list(starts) == [0, 2, 5]
+        assert list(ends) == [1, 4, 8]
+
+    def test_on_detect_peak_trough_adaptive_threshold(self):
+        detector = PeakDetector()
+        s = synthetic_ppg(100)
+        peaks, troughs = detector.detect_peak_trough_adaptive_threshold(s)
+        assert np.array_equal(peaks, signal.argrelmax(s)[0][::2])
+        assert len(troughs) == len(peaks) - 1
+        assert np.allclose(s[troughs], s.min(), atol=0.01)
+
+    def test_on_detect_peak_trough_adaptive_threshold_batch(self):
+        detector = PeakDetector()
+        rng = np.random.default_rng(0)
+        segments = synthetic_ppg(100, 300).reshape(10, 3000) + \
+            rng.normal(0, 0.2, (10, 3000))
+        out = detector.detect_peak_trough_adaptive_threshold_batch(segments)
+        assert len(out) == 10
+        for (peaks, troughs), s in zip(out, segments):
+            expected = detector.detect_peak_trough_adaptive_threshold(s)
+            assert np.array_equal(peaks, expected[0])
+            assert np.array_equal(troughs, expected[1])
+
+    def test_on_detect_peak_trough_moving_average_threshold(self):
+        for fs in [100, 250]:
+            detector = PeakDetector(fs=fs)
+            s = 100 + synthetic_ppg(fs)
+            peaks, troughs = \
+                detector.detect_peak_trough_moving_average_threshold(s)
+            assert np.allclose(np.diff(peaks), fs / 1.2, atol=2)
+            assert len(troughs) == len(peaks) - 1
+            assert np.all(peaks[:-1] < troughs) and np.all(troughs < peaks[1:])
+        peaks, troughs = PeakDetector().\
+            detect_peak_trough_moving_average_threshold(np.zeros(500),
+                                                        bandpass=False)
+        assert len(peaks) == 0 and len(troughs) == 0
 
     def test_on_detect_peak_trough_billauer(self):
         detector = PeakDetector()
-        pass
\ No newline at end of file
+        s = synthetic_ppg(100)
+        peaks, troughs = detector.detect_peak_trough_billauer(s)
+        assert np.array_equal(peaks, signal.argrelmax(s)[0][::2])
+        assert len(troughs) == len(peaks)
+        assert np.allclose(s[troughs], s.min(), atol=0.01)
+        # pure Python fallback gives the same result
+        fallback = _billauer(list(s), 0.1)
+        assert np.array_equal(fallback[0], peaks)
+        assert np.array_equal(fallback[1], troughs)
+        out = detector.ppg_detector(s, detector_type=BILLAUER_METHOD)
+        assert np.array_equal(out[0], peaks)
+        with pytest.raises(AssertionError) as exc_info:
+            detector.detect_peak_trough_billauer(s, delta=-1)
+        assert exc_info.match('delta must be positive')
+
+class TestStreamingPeakDetector(object):
+    def test_on_feed(self):
+        rng = np.random.default_rng(0)
+        for fs in [100, 250]:
+            s = synthetic_ppg(fs, 60) + rng.normal(0, 0.2, 60 * fs)
+            expected = PeakDetector(fs=fs).\
+                detect_peak_trough_adaptive_threshold(s)
+            detector = StreamingPeakDetector(fs=fs)
+            peaks, troughs = [], []
+            packet_sizes = rng.integers(1, 2 * fs, len(s))
+            bounds = np.cumsum(packet_sizes)
+            for packet in np.split(s, bounds[bounds < len(s)]):
+                n_before = detector._n
+                new_peaks, new_troughs = detector.feed(packet)
+                # confirmed about a moving average half window after them
+                assert np.all(new_peaks >= n_before - 2 * fs)
+                peaks.extend(new_peaks)
+                troughs.extend(new_troughs)
+            new_peaks, new_troughs = detector.flush()
+            assert np.array_equal(peaks + list(new_peaks), expected[0])
+            assert np.array_equal(troughs + list(new_troughs), expected[1])
+
+    def test_on_integer_signal(self):
+        # the signal lands on its moving average, which is not a crossing
+        rng = np.random.default_rng(1)
+        for fs, amplitude in [(100, 3), (100, 10), (50, 50)]:
+            s = np.round(amplitude * synthetic_ppg(fs, 60) +
+                         rng.normal(0, 0.05 * amplitude, 60 * fs))
+            expected = PeakDetector(fs=fs).\
+                detect_peak_trough_adaptive_threshold(s)
+            detector = StreamingPeakDetector(fs=fs)
+            peaks, troughs = [], []
+            bounds = np.cumsum(rng.integers(1, 3 * fs, len(s)))
+            for packet in np.split(s, bounds[bounds < len(s)]):
+                new_peaks, new_troughs = detector.feed(packet)
+                peaks.extend(new_peaks)
+                troughs.extend(new_troughs)
+            new_peaks, new_troughs = detector.flush()
+            assert np.array_equal(peaks + list(new_peaks), expected[0])
+            assert np.array_equal(troughs + list(new_troughs), expected[1])
+            assert len(expected[0]) >= 70
+
+    def test_on_buffer(self):
+        # packets longer than the ring buffer are split
+        fs = 100
+        s = synthetic_ppg(fs, 60)
+        detector = StreamingPeakDetector(fs=fs, buffer_duration=5)
+        peaks, troughs = detector.feed(s)
+        expected = PeakDetector(fs=fs).detect_peak_trough_adaptive_threshold(s)
+        assert np.array_equal(peaks, expected[0][:len(peaks)])
+        assert len(peaks) >= len(expected[0]) - 1
+        assert np.array_equal(troughs, expected[1][:len(troughs)])
+
+    def test_on_flush(self):
+        detector = StreamingPeakDetector()
+        peaks, troughs = detector.flush()
+        assert len(peaks) == 0 and len(troughs) == 0
+        detector.feed(synthetic_ppg(100, 10))
+        detector.flush()
+        assert detector._n == 0 and detector._last_peak is None
+
+
+class TestStreamingMatchedFilterDetector(object):
+    def test_on_feed(self):
+        fs = 256
+        s = synthetic_ecg(fs, 120)
+        expected = PeakDetector(wave_type='ecg', fs=fs).\
+            matched_filter_detector(s)
+        rng = np.random.default_rng(0)
+        detector = StreamingMatchedFilterDetector(fs=fs)
+        peaks = []
+        bounds = np.cumsum(rng.integers(0, 3 * fs, len(s)))
+        for chunk in np.split(s, bounds[bounds < len(s)]):
+            n_before = detector._n
+            new_peaks = detector.feed(chunk)
+            assert np.all(new_peaks < n_before + len(chunk))
+            peaks.extend(new_peaks)
+        peaks.extend(detector.flush())
+        assert np.array_equal(peaks, expected)
+
+    def test_on_flush(self):
+        detector = StreamingMatchedFilterDetector(fs=250)
+        assert len(detector.flush()) == 0
+        detector.feed(synthetic_ecg(250, 10))
+        detector.flush()
+        assert detector._n == 0 and detector._signal_peaks == [0]
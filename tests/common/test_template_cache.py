@@ -0,0 +1,69 @@
+import pytest
+import os
+import tempfile
+import numpy as np
+from vital_sqi.common.generate_template import (
+    ppg_nonlinear_dynamic_system_template,
+    ppg_dual_double_frequency_template
+)
+from vital_sqi.common.template_cache import TemplateCache
+from vital_sqi.sqi.dtw_sqi import dtw_sqi
+
+
+class TestTemplateCache(object):
+    def test_on_hit(self):
+        cache = TemplateCache()
+        first = cache.get(0, 100)
+        second = cache.get(0, 100)
+        assert first is second
+        assert cache.hits == 1 and cache.misses == 1
+        assert np.array_equal(first, ppg_nonlinear_dynamic_system_template(100))
+        assert not first.flags.writeable
+        cache.get(0, 101)
+        cache.get(1, 100)
+        assert cache.misses == 3
+
+    def test_on_arguments(self):
+        cache = TemplateCache()
+        cache.get(2, 100, a=4)
+        cache.get(2, 100, a=4)
+        cache.get(2, 100, a=3)
+        assert cache.hits == 1 and cache.misses == 2
+        assert cache.get_key(3, 100) == cache.get_key(3, 100, seed=0)
+        assert cache.get_key(3, 100) != TemplateCache(seed=1).get_key(3, 100)
+        assert cache.get_key(3, 100, ai=np.array([1, 2])) == \
+            cache.get_key(3, 100, ai=[1, 2])
+
+    def test_on_eviction(self):
+        cache = TemplateCache(maxsize=2)
+        cache.get(1, 10)
+        cache.get(1, 11)
+        cache.get(1, 10)
+        cache.get(1, 12)
+        assert len(cache._templates) == 2
+        cache.get(1, 10)
+        assert cache.hits == 2
+        cache.get(1, 11)
+        assert cache.misses == 4
+
+    def test_on_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        template = TemplateCache(cache_dir=cache_dir).get(1, 50)
+        assert len(os.listdir(cache_dir)) == 1
+        cache = TemplateCache(cache_dir=cache_dir)
+        assert np.array_equal(cache.get(1, 50), template)
+        assert np.array_equal(template, ppg_dual_double_frequency_template(50))
+        cache.clear()
+        assert os.listdir(cache_dir) == []
+
+    def test_on_invalid_template_type(self):
+        with pytest.raises(ValueError) as exc_info:
+            TemplateCache().get(4, 100)
+        assert exc_info.match("Invalid template type")
+
+    def test_on_dtw_sqi(self):
+        cache = TemplateCache()
+        x = np.sin(np.linspace(0, 6, 50))
+        first = dtw_sqi(x, 1, template_cache=cache)
+        assert dtw_sqi(x, 1, template_cache=cache) == first
+        assert cache.hits == 1 and cache.misses == 1
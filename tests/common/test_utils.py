@@ -1,7 +1,10 @@
 import pytest
 import numpy as np
 import pandas as pd
-from vital_sqi.common.utils import check_valid_signal
+import datetime as dt
+from vital_sqi.common.utils import check_valid_signal, \
+    calculate_sampling_rate, timestamps_to_seconds, generate_timestamp, \
+    generate_timestamp_array
 
 
 class TestCheckInvalidSignal(object):
@@ -28,3 +31,56 @@ class TestCheckInvalidSignal(object):
             with pytest.raises(ValueError) as exec_info:
                 check_valid_signal(i)
             assert exec_info.match("Expected array_like input")
+
+
+class TestCalculateSamplingRate(object):
+
+    def test_on_float_timestamps(self):
+        x = np.arange(1000) / 250
+        assert calculate_sampling_rate(x) == 250
+
+    def test_on_datetime_strings(self):
+        x = pd.date_range('2020-12-12 10:10:00', periods = 1000,
+                          freq = '10ms')
+        x = x.strftime('%Y-%m-%d %H:%M:%S.%f').to_numpy()
+        assert calculate_sampling_rate(x) == 100
+        assert np.allclose(timestamps_to_seconds(x), np.arange(1000) / 100)
+
+    def test_on_jitter(self):
+        x = np.arange(1000) / 100
+        x = np.delete(x, [100, 101, 102])
+        sampling_rate, jitter = calculate_sampling_rate(x,
+                                                        return_jitter = True)
+        assert sampling_rate == 100
+        assert np.isclose(jitter['max_step'], 0.04)
+        assert np.isclose(jitter['gap_ratio'], 1 / 996)
+
+    def test_on_invalid_timestamps(self):
+        assert calculate_sampling_rate(np.array(['a', 'b'])) is None
+        assert calculate_sampling_rate(np.zeros(10)) is None
+
+
+class TestGenerateTimestamp(object):
+    start = dt.datetime(2020, 12, 12, 10, 10)
+
+    def test_on_datetime64(self):
+        x = generate_timestamp_array(self.start, 256, 1000)
+        assert x.dtype == np.dtype('datetime64[ns]')
+        assert len(x) == 1000
+        assert x[0] == np.datetime64(self.start)
+        assert x[256] == np.datetime64('2020-12-12T10:10:01')
+
+    def test_on_epoch(self):
+        x = generate_timestamp_array(self.start, 100, 10, unit = 'epoch')
+        assert x[0] == 1607767800
+        assert np.allclose(np.diff(x), 0.01, atol = 1e-6)
+
+    def test_on_list(self):
+        x = generate_timestamp(self.start, 100, 10)
+        assert x[0] == self.start
+        assert x[-1] == self.start + dt.timedelta(seconds = 0.09)
+
+    def test_on_invalid_sampling_rate(self):
+        with pytest.raises(Exception) as exc_info:
+            generate_timestamp_array(self.start, 0, 10)
+        assert exc_info.match("check sampling rate")
@@ -0,0 +1,110 @@
+import os
+import sys
+import functools
+import subprocess
+import pytest
+import tempfile
+import numpy as np
+from vital_sqi.data.signal_io import ECG_reader, PPG_reader
+from vital_sqi.data.signal_cache import SignalCache
+
+
+class CountingReader(object):
+    __module__ = 'tests'
+    __name__ = 'counting_reader'
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.calls = 0
+
+    def __call__(self, file_name, **kwargs):
+        self.calls = self.calls + 1
+        return self.reader(file_name, **kwargs)
+
+
+class UnnamedReader(object):
+    def __call__(self, file_name, **kwargs):
+        return PPG_reader(file_name, **kwargs)
+
+
+class TestSignalCache(object):
+    file_name = os.path.abspath('tests/test_data/ppg_smartcare.csv')
+    kwargs = dict(signal_idx = ['PLETH'], timestamp_idx = ['TIMESTAMP_MS'],
+                  info_idx = ['PULSE_BPM'])
+
+    def test_on_hit(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp())
+        reader = CountingReader(PPG_reader)
+        first = cache.read(reader, self.file_name, **self.kwargs)
+        second = cache.read(reader, self.file_name, **self.kwargs)
+        assert reader.calls == 1
+        assert isinstance(second.signals, np.memmap)
+        assert np.array_equal(first.signals, second.signals)
+        assert second.sampling_rate == 100
+        assert second.info['PULSE_BPM'][:3] == [87, 87, 87]
+
+    def test_on_changed_arguments(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp())
+        reader = CountingReader(PPG_reader)
+        cache.read(reader, self.file_name, **self.kwargs)
+        cache.read(reader, self.file_name, sampling_rate = 50, **self.kwargs)
+        assert reader.calls == 2
+
+    def test_on_partial_reader(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp())
+        counting_reader = CountingReader(PPG_reader)
+        reader = functools.partial(counting_reader, **self.kwargs)
+        first = cache.read(reader, self.file_name)
+        second = cache.read(reader, self.file_name)
+        assert counting_reader.calls == 1
+        assert isinstance(second.signals, np.memmap)
+        assert np.array_equal(first.signals, second.signals)
+        # the key holds no memory address, it is the same in every process
+        key = cache.get_key(functools.partial(PPG_reader, file_type = 'csv'),
+                            self.file_name)
+        code = ('import functools\n'
+                'from vital_sqi.data.signal_io import PPG_reader\n'
+                'from vital_sqi.data.signal_cache import SignalCache\n'
+                'print(SignalCache().get_key(functools.partial('
+                'PPG_reader, file_type="csv"), {!r}))'.format(self.file_name))
+        output = subprocess.run([sys.executable, '-c', code],
+                                capture_output = True, text = True,
+                                check = True).stdout
+        assert output.strip() == key
+        assert key != cache.get_key(
+            functools.partial(PPG_reader, file_type = 'xlsx'), self.file_name)
+
+    def test_on_unnamed_reader(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp())
+        with pytest.raises(ValueError) as exc_info:
+            cache.get_key(UnnamedReader(), self.file_name)
+        assert exc_info.match('must be a function')
+
+    def test_on_mit_record(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp())
+        file_name = os.path.abspath('tests/test_data/a103l')
+        out = cache.read(ECG_reader, file_name, file_type = 'mit')
+        assert np.array_equal(out.signals,
+                              ECG_reader(file_name, 'mit').signals)
+
+    def test_on_disabled(self):
+        cache_dir = tempfile.mkdtemp()
+        cache = SignalCache(cache_dir = cache_dir, enabled = False)
+        reader = CountingReader(PPG_reader)
+        cache.read(reader, self.file_name, **self.kwargs)
+        out = cache.read(reader, self.file_name, **self.kwargs)
+        assert reader.calls == 2
+        assert not isinstance(out.signals, np.memmap)
+        assert os.listdir(cache_dir) == []
+
+    def test_on_eviction(self):
+        cache = SignalCache(cache_dir = tempfile.mkdtemp(), max_size = 1)
+        reader = CountingReader(PPG_reader)
+        out = cache.read(reader, self.file_name, **self.kwargs)
+        assert not isinstance(out.signals, np.memmap)
+        assert os.listdir(cache.cache_dir) == []
+        cache.max_size = 2 * 1024 ** 3
+        cache.read(reader, self.file_name, **self.kwargs)
+        assert cache.evict() > 0
+        cache.clear()
+        assert cache.evict() == 0
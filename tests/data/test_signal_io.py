@@ -2,6 +2,7 @@ import pytest
 import os
 import tempfile
 import datetime as dt
+import numpy as np
 from vital_sqi.data.signal_io import *
 
 
@@ -113,6 +114,79 @@ class TestPPGReader(object):
         assert exc_info.match("Timestamp unit must be either second")
 
 
+class TestPPGStreamReader(object):
+
+    def test_on_valid_ppg(self):
+        file_name = os.path.abspath('tests/test_data/ppg_smartcare.csv')
+        idx = dict(signal_idx = ['PLETH'], timestamp_idx = ['TIMESTAMP_MS'],
+                   info_idx = ['PULSE_BPM', 'SPO2_PCT', 'PERFUSION_INDEX'])
+        whole = PPG_reader(file_name, **idx)
+        chunks = list(PPG_stream_reader(file_name, chunk_duration = 60,
+                                        read_size = 5000, **idx))
+        assert all(isinstance(c, SignalSQI) for c in chunks)
+        assert [len(c.signals) for c in chunks] == [6000, 6000, 6000, 5998]
+        assert all(c.sampling_rate == whole.sampling_rate for c in chunks)
+        assert np.array_equal(np.concatenate([c.signals for c in chunks]),
+                              whole.signals)
+        assert np.array_equal(
+                np.concatenate([c.info['PULSE_BPM'] for c in chunks]),
+                whole.info['PULSE_BPM'])
+        assert chunks[1].info['TIMESTAMP_MS'][0] - \
+               chunks[0].info['TIMESTAMP_MS'][-1] == 10
+
+    def test_on_start_datetime(self):
+        file_name = os.path.abspath('tests/test_data/ppg_smartcare.csv')
+        chunks = list(PPG_stream_reader(file_name, signal_idx = ['PLETH'],
+                                        timestamp_idx = ['TIMESTAMP_MS'],
+                                        info_idx = [], chunk_duration = 60,
+                                        sampling_rate = 100,
+                                        start_datetime = '2020-12-30 '
+                                                         '10:00:00'))
+        assert chunks[0].start_datetime == dt.datetime(2020, 12, 30, 10)
+        assert chunks[2].start_datetime == dt.datetime(2020, 12, 30, 10, 2)
+
+
+    def test_on_unknown_sampling_rate(self):
+        # a single timestamp in the first read does not give the rate
+        file_name = os.path.abspath('tests/test_data/ppg_smartcare.csv')
+        with pytest.raises(AssertionError) as exc_info:
+            list(PPG_stream_reader(file_name, signal_idx = ['PLETH'],
+                                   timestamp_idx = ['TIMESTAMP_MS'],
+                                   info_idx = [], read_size = 1))
+        assert exc_info.match('pass sampling_rate')
+        chunks = list(PPG_stream_reader(file_name, signal_idx = ['PLETH'],
+                                        timestamp_idx = ['TIMESTAMP_MS'],
+                                        info_idx = [], read_size = 1000,
+                                        chunk_duration = 60,
+                                        sampling_rate = 100))
+        assert len(chunks[0].signals) == 6000
+
+class TestNPYWriterReader(object):
+
+    def test_on_round_trip(self):
+        file_in = os.path.abspath('tests/test_data/example.edf')
+        out = ECG_reader(file_in, 'edf')
+        out.update_sqi_indexes(np.ones((3, 2)))
+        file_out = tempfile.mkdtemp() + '/out_npy'
+        assert NPY_writer(out, file_out) is True
+        res = NPY_reader(file_out)
+        assert isinstance(res.signals, np.memmap)
+        assert res.is_memmap() is True
+        assert np.shares_memory(res.get_segments(100), res.signals)
+        assert np.array_equal(res.signals, out.signals)
+        assert res.wave_type == 'ecg'
+        assert res.start_datetime == out.start_datetime
+        assert res.info[0]['startdate'] == out.info[0]['startdate']
+        assert np.array_equal(res.sqi_indexes, out.sqi_indexes)
+        res = NPY_reader(file_out, mmap_mode = None)
+        assert not isinstance(res.signals, np.memmap)
+
+    def test_on_file_not_found(self):
+        with pytest.raises(AssertionError) as exc_info:
+            NPY_reader(tempfile.mkdtemp())
+        assert exc_info.match('File not found')
+
+
 class TestPPGWriter(object):
 
     def test_on_valid_ppg(self):
@@ -0,0 +1,42 @@
+import numpy as np
+from vital_sqi.data.signal_sqi_class import SignalSQI
+
+
+class TestGetSegment(object):
+
+    def test_on_view(self):
+        signals = np.arange(100.0)
+        out = SignalSQI(signals = signals).get_segment(10, 20)
+        assert np.array_equal(out, np.arange(10.0, 20.0))
+        assert np.shares_memory(out, signals)
+
+
+class TestGetSegments(object):
+
+    def test_on_1d(self):
+        signals = np.arange(105.0)
+        out = SignalSQI(signals = signals).get_segments(10)
+        assert out.shape == (10, 10)
+        assert np.array_equal(out[3], np.arange(30.0, 40.0))
+        assert np.shares_memory(out, signals)
+
+    def test_on_overlap(self):
+        out = SignalSQI(signals = np.arange(100.0)).get_segments(10, 5)
+        assert out.shape == (19, 10)
+        assert np.array_equal(out[1], np.arange(5.0, 15.0))
+
+    def test_on_multichannel(self):
+        signals = np.arange(200.0).reshape(100, 2)
+        out = SignalSQI(signals = signals).get_segments(10)
+        assert out.shape == (10, 10, 2)
+        assert np.array_equal(out[1], signals[10:20])
+
+    def test_on_short_signal(self):
+        out = SignalSQI(signals = np.arange(5.0)).get_segments(10)
+        assert out.shape == (0, 10)
+
+
+class TestIsMemmap(object):
+
+    def test_on_in_memory(self):
+        assert SignalSQI(signals = np.arange(5.0)).is_memmap() is False
@@ -2,7 +2,15 @@ import pytest
 import numpy as np
 from scipy.signal import butter, lfilter, freqz
 from scipy import signal
-from vital_sqi.preprocess.band_filter import BandpassFilter
+from vital_sqi.preprocess.band_filter import BandpassFilter, \
+    StreamingFilter, _design_filter
+
+BAND_TYPES = ['butter', 'cheby1', 'cheby2', 'ellip', 'bessel']
+
+
+def random_walk(n=2000):
+    return np.random.default_rng(0).normal(size=n).cumsum()
+
 
 class TestBandpassFilter:
     def test_on_init(self):
@@ -11,13 +19,99 @@ class TestBandpassFilter:
 class TestSignalBypass(object):
     def test_on_signal_bypass(self):
         band_filter = BandpassFilter()
-        pass
+        b, a = band_filter.signal_bypass(1, 2, 3, 4, 40, btype='high')
+        expected = butter(2, 1 / 50, btype='high')
+        assert np.allclose(b, expected[0]) and np.allclose(a, expected[1])
+        sos = band_filter.signal_bypass(1, 2, 3, 4, 40, output='sos')
+        assert np.allclose(sos, butter(2, 1 / 50, btype='high',
+                                       output='sos'))
+
+    def test_on_cache(self):
+        _design_filter.cache_clear()
+        for _ in range(10):
+            BandpassFilter(fs=100).signal_lowpass_filter(random_walk(), 12)
+        assert _design_filter.cache_info().misses == 1
+        assert _design_filter.cache_info().hits == 9
+        # the cached design is not exposed to the caller
+        sos = BandpassFilter(fs=100).signal_bypass(12, 3, 3, 4, 40, 'low',
+                                                    output='sos')
+        sos[:] = 0
+        assert np.any(BandpassFilter(fs=100).signal_bypass(
+            12, 3, 3, 4, 40, 'low', output='sos'))
+        BandpassFilter(fs=250).signal_lowpass_filter(random_walk(), 12)
+        assert _design_filter.cache_info().misses == 2
 class TestSignalLowpassFilter(object):
     def test_on_signal_lowpass_filter(self):
-        band_filter = BandpassFilter()
-        pass
+        x = random_walk()
+        for band_type in BAND_TYPES:
+            band_filter = BandpassFilter(band_type, fs=100)
+            b, a = band_filter.signal_bypass(12, 3, 3, 4, 40, btype='low')
+            assert np.allclose(band_filter.signal_lowpass_filter(x, 12),
+                               lfilter(b, a, x))
 class TestSignalHighpassFilter(object):
     def test_on_signal_highpass_filter(self):
-        band_filter = BandpassFilter()
-        pass
+        x = random_walk()
+        for band_type in BAND_TYPES:
+            band_filter = BandpassFilter(band_type, fs=100)
+            b, a = band_filter.signal_bypass(1, 2, 3, 4, 40, btype='high')
+            assert np.allclose(
+                band_filter.signal_highpass_filter(x, 1, order=2),
+                signal.filtfilt(b, a, x))
+class TestSignalBandpassFilter(object):
+    def test_on_signal_bandpass_filter(self):
+        x = random_walk()
+        for band_type in BAND_TYPES:
+            band_filter = BandpassFilter(band_type, fs=100)
+            b, a = band_filter.signal_bypass((1, 12), 2, 3, 4, 40,
+                                             btype='band')
+            assert np.allclose(
+                band_filter.signal_bandpass_filter(x, (1, 12), order=2),
+                lfilter(b, a, x))
+            assert np.allclose(
+                band_filter.signal_bandpass_filter(x, (1, 12), order=2,
+                                                   zero_phase=True),
+                signal.filtfilt(b, a, x))
+        with pytest.raises(AssertionError) as exc_info:
+            BandpassFilter(fs=100).signal_bandpass_filter(x, (12, 1))
+        assert exc_info.match('cutoff must be')
+
+    def test_on_axis_and_out(self):
+        band_filter = BandpassFilter(fs=100)
+        batch = random_walk(3000).reshape(3, 1000)
+        expected = np.array([band_filter.signal_bandpass_filter(row, (1, 12))
+                             for row in batch])
+        assert np.allclose(band_filter.signal_bandpass_filter(batch, (1, 12)),
+                           expected)
+        leads = batch.T.copy()
+        assert np.allclose(band_filter.signal_bandpass_filter(
+            leads, (1, 12), axis=0), expected.T)
+        out = band_filter.signal_bandpass_filter(batch, (1, 12), out=batch)
+        assert out is batch
+        assert np.allclose(batch, expected)
+class TestStreamingFilter(object):
+    def test_on_process(self):
+        x = random_walk(5000)
+        bounds = np.cumsum(np.random.default_rng(1).integers(1, 500, 30))
+        chunks = np.split(x, bounds[bounds < len(x)])
+        for band_type in BAND_TYPES:
+            for btype, cutoff in [('low', 12), ('high', 1), ('band', (1, 12))]:
+                stream = StreamingFilter(cutoff, btype, band_type, fs=100)
+                y = np.concatenate([stream.process(chunk)
+                                    for chunk in chunks])
+                sos = stream.signal_bypass(cutoff, 3, 3, 4, 40, btype,
+                                           output='sos')
+                assert np.allclose(y, signal.sosfilt(sos, x))
+        stream = StreamingFilter(12, fs=100)
+        y = np.concatenate([stream.process(chunk) for chunk in chunks])
+        assert np.allclose(
+            y, BandpassFilter(fs=100).signal_lowpass_filter(x, 12))
 
+    def test_on_axis_and_reset(self):
+        leads = random_walk(3000).reshape(1000, 3)
+        stream = StreamingFilter(12, fs=100, axis=0)
+        y = np.concatenate([stream.process(leads[:400]),
+                            stream.process(leads[400:])])
+        expected = BandpassFilter(fs=100).signal_lowpass_filter(leads.T, 12)
+        assert np.allclose(y, expected.T)
+        stream.reset()
+        assert np.allclose(stream.process(leads), expected.T)
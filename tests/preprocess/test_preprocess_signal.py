@@ -1,15 +1,84 @@
 import pytest
 import numpy as np
 from scipy import signal
+from vital_sqi.preprocess.preprocess_signal import scale_pattern, \
+    scale_pattern_batch, squeeze_template, smooth, SMOOTH_WINDOWS
 class TestTapering(object):
     def test_on_apering(self):
         pass
 class TestSmooth(object):
     def test_on_smooth(self):
-        pass
+        x = np.random.default_rng(0).normal(size=200)
+        assert np.array_equal(smooth(x), np.convolve(np.ones(5) / 5, x,
+                                                     'same'))
+        for window in ['hanning', 'hamming', 'bartlett', 'blackman']:
+            w = getattr(np, window)(7)
+            assert np.allclose(smooth(x, 7, window),
+                               np.convolve(w / w.sum(), x, 'same'))
+        assert np.array_equal(smooth(x, 2), x)
+
+    def test_on_smooth_fft(self):
+        x = np.random.default_rng(0).normal(size=500)
+        expected = np.convolve(np.ones(100) / 100, x, 'same')
+        assert np.allclose(smooth(x, 100), expected)
+        assert np.allclose(smooth(x, 100, method='direct'), expected)
+        assert np.allclose(smooth(x, 5, method='fft'), smooth(x, 5))
+
+    def test_on_smooth_axis(self):
+        batch = np.random.default_rng(0).normal(size=(3, 100))
+        expected = np.array([smooth(row, 6, 'hanning') for row in batch])
+        assert np.allclose(smooth(batch, 6, 'hanning', axis=1), expected)
+        assert np.allclose(smooth(batch.T, 6, 'hanning', axis=0), expected.T)
+        assert np.allclose(smooth(batch, 80, axis=1),
+                           [smooth(row, 80) for row in batch])
+
+    def test_on_smooth_invalid(self):
+        with pytest.raises(ValueError) as exc_info:
+            smooth(np.ones(3))
+        assert exc_info.match('bigger than window size')
+        with pytest.raises(ValueError) as exc_info:
+            smooth(np.ones(10), window='gauss')
+        assert exc_info.match("Window is one of 'flat'")
+        with pytest.raises(ValueError):
+            smooth(1.0)
+        with pytest.raises(ValueError):
+            smooth(np.ones(10), method='fast')
+
+    def test_on_window_registry(self):
+        SMOOTH_WINDOWS['triangle'] = np.bartlett
+        try:
+            assert np.allclose(smooth(np.arange(20.0), 5, 'triangle'),
+                               smooth(np.arange(20.0), 5, 'bartlett'))
+        finally:
+            del SMOOTH_WINDOWS['triangle']
 class TestScalePatterns(object):
     def test_on_scale_pattern(self):
-        pass
+        s = np.arange(10.0)
+        assert np.array_equal(scale_pattern(s, 10), s)
+        # spanned by repeating samples, then smoothed
+        spanned = np.repeat(s, 2)
+        assert np.allclose(scale_pattern(s, 20),
+                           np.convolve(np.ones(5) / 5, spanned, 'same'))
+        squeezed = squeeze_template(s, 5)
+        assert np.allclose(scale_pattern(s, 5),
+                           np.convolve(np.ones(5) / 5, squeezed, 'same'))
+
+    def test_on_scale_pattern_batch(self):
+        rng = np.random.default_rng(0)
+        beats = [rng.normal(size=n) for n in [5, 40, 99, 100, 101, 300]]
+        out = scale_pattern_batch(beats, 100)
+        assert out.shape == (6, 100)
+        for row, beat in zip(out, beats):
+            assert np.allclose(row, scale_pattern(beat, 100))
+        assert np.array_equal(out[3], beats[3])
+        assert scale_pattern_batch([], 100).shape == (0, 100)
 class TestSqueezeTemplate(object):
     def test_on_squeeze_template(self):
-        pass
+        s = np.arange(10.0)
+        # mean of s[int(c) - 2:int(c + 2)] around centroids c = 2 * i
+        assert np.allclose(squeeze_template(s, 5), [0.5, 1.5, 3.5, 5.5, 7.5])
+        # centroid + 2 rounding up widens the window to 5 samples
+        s = np.random.default_rng(0).normal(size=210)
+        assert np.isclose(squeeze_template(s, 150)[45], np.mean(s[60:65]))
+        # windows past the end are clipped
+        assert not np.any(np.isnan(squeeze_template(np.arange(10.0), 20)))
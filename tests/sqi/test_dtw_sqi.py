@@ -1,5 +1,14 @@
 import pytest
-from vital_sqi.sqi.dtw_sqi import dtw_sqi
+import importlib
+import numpy as np
+from dtw import dtw
+from dtw.window import itakuraWindow
+from vital_sqi.common.rpeak_detection import PeakDetector
+from vital_sqi.common.template_cache import TemplateCache
+from vital_sqi.sqi.dtw_sqi import dtw_sqi, dtw_sqi_batch, \
+    beat_template_sqi, _dtw_open_asymmetric, _window_bounds
+
+dtw_sqi_module = importlib.import_module('vital_sqi.sqi.dtw_sqi')
 
 class TestDtwSqi(object):
     x = [0, 1, 2, 3]
@@ -21,3 +30,140 @@ class TestDtwSqi(object):
         template_types = [0, 1, 2, 3]
         for i in template_types:
             assert type(dtw_sqi(x, i)) is float
+
+
+def reference_dtw_sqi(x, reference, **kwargs):
+    alignment = dtw(x, reference, keep_internals=True,
+                    step_pattern='asymmetric', open_end=True,
+                    open_begin=True, **kwargs)
+    match_distance = [alignment.costMatrix[i][alignment.index2[i]]
+                      for i in range(len(alignment.index2))]
+    return np.sum(match_distance), alignment.costMatrix.trace()
+
+
+class TestDtwOpenAsymmetric(object):
+    def test_on_dtw_python(self):
+        rng = np.random.default_rng(0)
+        for n, m in [(1, 1), (30, 30), (25, 40), (40, 12)]:
+            x = rng.normal(size=n)
+            y = rng.normal(size=m)
+            expected = reference_dtw_sqi(x, y)
+            out = _dtw_open_asymmetric(x.reshape(1, -1), y)
+            assert out[0][0] == expected[0]
+            assert out[1][0] == expected[1]
+
+    def test_on_window(self):
+        rng = np.random.default_rng(1)
+        x = rng.normal(size=50)
+        y = rng.normal(size=50)
+        expected = reference_dtw_sqi(x, y, window_type='sakoechiba',
+                                     window_args={'window_size': 3})
+        out = _dtw_open_asymmetric(x.reshape(1, -1), y, 'sakoechiba', 3)
+        assert out[0][0] == expected[0] and out[1][0] == expected[1]
+        expected = reference_dtw_sqi(x, y[:30], window_type='itakura')
+        out = _dtw_open_asymmetric(x.reshape(1, -1), y[:30], 'itakura')
+        assert out[0][0] == expected[0] and np.isnan(out[1][0])
+        with pytest.raises(ValueError) as exc_info:
+            _dtw_open_asymmetric(x[:10].reshape(1, -1), y, 'itakura')
+        assert exc_info.match('No warping path found')
+
+    def test_on_window_bounds(self):
+        for n, m in [(10, 10), (12, 25), (20, 7)]:
+            lo, hi = _window_bounds(n, m, 'itakura')
+            iw, jw = np.indices((n + 1, m))
+            mask = itakuraWindow(iw, jw, n + 1, m)[1:]
+            for i in range(n):
+                cols = np.flatnonzero(mask[i])
+                if len(cols) == 0:
+                    assert lo[i] > hi[i]
+                else:
+                    assert (lo[i], hi[i]) == (cols[0], cols[-1])
+        lo, hi = _window_bounds(5, 5, 'sakoechiba', 1)
+        assert list(lo) == [0, 1, 2, 3, 4] and list(hi) == [2, 3, 4, 4, 4]
+        with pytest.raises(ValueError):
+            _window_bounds(5, 5, 'sakoechiba')
+        with pytest.raises(ValueError):
+            _window_bounds(5, 5, 'slanted')
+
+
+class TestDtwSqiBatch(object):
+    def test_on_batch(self):
+        rng = np.random.default_rng(0)
+        segments = np.sin(np.linspace(0, 6, 80)) + \
+            rng.normal(0, 0.2, (5, 80))
+        for template_type in [0, 1, 2]:
+            out = dtw_sqi_batch(segments, template_type)
+            assert np.array_equal(out, [dtw_sqi(s, template_type)
+                                        for s in segments])
+        out = dtw_sqi_batch(segments, 1, window_type='sakoechiba',
+                            window_size=5)
+        assert np.array_equal(out, [dtw_sqi(s, 1, window_type='sakoechiba',
+                                            window_size=5)
+                                    for s in segments])
+        assert len(dtw_sqi_batch(np.empty((0, 80)))) == 0
+
+    def test_on_chunks(self, monkeypatch):
+        segments = np.random.default_rng(0).normal(size=(7, 40))
+        expected = dtw_sqi_batch(segments, 1)
+        monkeypatch.setattr(dtw_sqi_module, 'DTW_MEMORY', 3 * 40 * 40)
+        assert np.array_equal(dtw_sqi_batch(segments, 1), expected)
+
+    def test_on_invalid(self):
+        with pytest.raises(ValueError) as exc_info:
+            dtw_sqi_batch(np.ones((2, 10)), 4)
+        assert exc_info.match("Invalid template type")
+        with pytest.raises(ValueError):
+            dtw_sqi_batch(np.ones(10))
+
+
+class TestBeatTemplateSqi(object):
+    fs = 100
+    t = np.arange(0, 30, 1 / fs)
+    clean = np.sin(2 * np.pi * 1.2 * t) + \
+        0.5 * np.sin(2 * np.pi * 2.4 * t - 1)
+
+    def test_on_correlation(self):
+        summary, scores = beat_template_sqi(self.clean,
+                                            template_type='average')
+        assert summary['n_beats'] == len(scores) == 34
+        assert np.all(scores > 0.999)
+        noisy = self.clean + \
+            np.random.default_rng(0).normal(0, 0.8, len(self.clean))
+        noisy_summary, _ = beat_template_sqi(noisy, template_type='average')
+        assert noisy_summary['mean'] < summary['mean']
+        summary, scores = beat_template_sqi(self.clean, template_type=1)
+        assert np.all((scores > -1) & (scores < 1))
+        assert summary['min'] == np.min(scores)
+
+    def test_on_dtw(self):
+        cache = TemplateCache()
+        summary, scores = beat_template_sqi(self.clean, template_type=1,
+                                            method='dtw',
+                                            template_cache=cache)
+        assert summary['n_beats'] == len(scores)
+        assert cache.misses == 1
+        _, banded = beat_template_sqi(self.clean, template_type=1,
+                                      method='dtw', template_cache=cache,
+                                      window_size=10)
+        assert cache.hits == 1
+        assert len(banded) == len(scores)
+
+    def test_on_template(self):
+        _, troughs = PeakDetector().ppg_detector(self.clean)
+        beat = self.clean[troughs[0]:troughs[1]]
+        _, scores = beat_template_sqi(self.clean, template=beat)
+        assert np.all(scores > 0.99)
+
+    def test_on_no_beat(self):
+        summary, scores = beat_template_sqi(np.ones(300),
+                                            template_type='average')
+        assert summary['n_beats'] == 0 and len(scores) == 0
+        assert np.isnan(summary['mean'])
+
+    def test_on_invalid(self):
+        with pytest.raises(ValueError) as exc_info:
+            beat_template_sqi(self.clean, template_type=4)
+        assert exc_info.match("Invalid template type")
+        with pytest.raises(ValueError) as exc_info:
+            beat_template_sqi(self.clean, method='euclidean')
+        assert exc_info.match("Invalid method")
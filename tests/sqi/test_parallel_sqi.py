@@ -0,0 +1,44 @@
+import tempfile
+import numpy as np
+from vital_sqi.data.signal_sqi_class import SignalSQI
+from vital_sqi.data.signal_io import NPY_writer, NPY_reader
+from vital_sqi.sqi.standard_sqi import kurtosis_sqi, batch_standard_sqi
+from vital_sqi.sqi.parallel_sqi import parallel_sqi
+
+
+def segment_stats(x):
+    return {'mean': np.mean(x), 'max': np.max(x)}
+
+
+class TestParallelSqi(object):
+    signals = np.random.default_rng(0).normal(size=10050)
+
+    def test_on_serial(self):
+        signal_sqi = SignalSQI(signals=self.signals)
+        out = parallel_sqi(signal_sqi, segment_stats, 100, n_workers=1)
+        assert out.shape == (100, 2)
+        assert signal_sqi.sqi_indexes is out
+        assert np.allclose(out['max'],
+                           self.signals[:10000].reshape(100, 100).max(1))
+
+    def test_on_parallel(self):
+        serial = parallel_sqi(self.signals, kurtosis_sqi, 100, step=50,
+                              n_workers=1)
+        out = parallel_sqi(self.signals, kurtosis_sqi, 100, step=50,
+                           n_workers=2, chunk_size=16)
+        assert list(out.columns) == ['kurtosis_sqi']
+        assert len(out) == 200
+        assert np.allclose(out, serial)
+
+    def test_on_batch_memmap(self):
+        file_name = tempfile.mkdtemp() + '/signals'
+        NPY_writer(SignalSQI(signals=self.signals), file_name)
+        signal_sqi = NPY_reader(file_name)
+        out = parallel_sqi(signal_sqi, batch_standard_sqi, 100,
+                           n_workers=2, chunk_size=16, batch=True)
+        expected = batch_standard_sqi(signal_sqi.get_segments(100))
+        assert np.allclose(out, expected, equal_nan=True)
+
+    def test_on_short_signal(self):
+        out = parallel_sqi(self.signals[:10], kurtosis_sqi, 100)
+        assert len(out) == 0
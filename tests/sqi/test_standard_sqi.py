@@ -1,6 +1,9 @@
 import pytest
 import numpy as np
 from scipy.stats import kurtosis, skew, entropy
+from vital_sqi.sqi.standard_sqi import batch_standard_sqi, perfusion_sqi, \
+    kurtosis_sqi, skewness_sqi, entropy_sqi, signal_to_noise_sqi, \
+    zero_crossings_rate_sqi, mean_crossing_rate_sqi, msq_sqi
 class TestPerfusionSqi(object):
     def test_on_perfusion_sqi(self):
         pass
@@ -27,4 +30,31 @@ class TestMeanCrossingRateSqi(object):
 
 class TestMSQSqi(object):
     def test_on_msq_sqi(self):
-         pass
+        t = np.arange(0, 30, 0.01)
+        assert msq_sqi(np.sin(2 * np.pi * 1.2 * t)) == 1.0
+
+class TestBatchStandardSqi(object):
+    rng = np.random.default_rng(0)
+    segments = np.vstack((rng.normal(5, 1, (4, 300)),
+                          np.sin(np.linspace(0, 20, 300)),
+                          np.ones(300)))
+
+    def test_on_batch_standard_sqi(self):
+        out = batch_standard_sqi(self.segments, chunk_size=4)
+        assert out.shape == (6, 7)
+        for i, x in enumerate(self.segments[:5]):
+            expected = [perfusion_sqi(np.mean(x), x), kurtosis_sqi(x),
+                        skewness_sqi(x), entropy_sqi(x),
+                        signal_to_noise_sqi(x), zero_crossings_rate_sqi(x),
+                        mean_crossing_rate_sqi(x)]
+            assert np.allclose(out.iloc[i].to_numpy(), expected)
+        assert np.isnan(out['kurtosis_sqi'][5])
+        assert out['signal_to_noise_sqi'][5] == 0
+
+    def test_on_sqi_names(self):
+        out = batch_standard_sqi(self.segments[0], ['skewness_sqi'])
+        assert list(out.columns) == ['skewness_sqi']
+        assert len(out) == 1
+        with pytest.raises(ValueError) as exc_info:
+            batch_standard_sqi(self.segments, ['abc'])
+        assert exc_info.match("Invalid SQI name")
@@ -11,6 +11,11 @@ from vital_sqi.common.generate_template import (
 	ecg_dynamic_template,
 	)
 from vital_sqi.common.rpeak_detection import (
-	PeakDetector
+	PeakDetector,
+	StreamingPeakDetector,
+	StreamingMatchedFilterDetector
+	)
+from vital_sqi.common.template_cache import (
+	TemplateCache
 	)
 from vital_sqi.common.utils import *
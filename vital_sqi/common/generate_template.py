@@ -134,11 +134,15 @@ def ecg_dynamic_template(width, sfecg=256, N=256, Anoise=0, hrmean=60,
                          hrstd=1, lfhfratio=0.5, sfint=512,
                          ti=np.array([-70, -15, 0, 15, 100]),
                          ai=np.array([1.2, -5, 30, -7.5, 0.75]),
-                         bi=np.array([0.25, 0.1, 0.1, 0.1, 0.4])
+                         bi=np.array([0.25, 0.1, 0.1, 0.1, 0.4]),
+                         seed=None
                          ):
     """
     EXPOSE
-    :param width:
+    One second of synthetic ECG (McSharry et al.), from 20.5 s of the
+    simulation, sampled at width Hz.
+    :param width: the sample size of the generated waveform, i.e. its
+        sampling rate
     :param sfecg:
     :param N:
     :param Anoise:
@@ -149,6 +153,8 @@ def ecg_dynamic_template(width, sfecg=256, N=256, Anoise=0, hrmean=60,
     :param ti:
     :param ai:
     :param bi:
+    :param seed: seed of the random phases of the RR process, None for
+        the global numpy random state
     :return:
     """
     # convert to radians
@@ -172,7 +178,7 @@ def ecg_dynamic_template(width, sfecg=256, N=256, Anoise=0, hrmean=60,
     Nrr = 2 ** (np.ceil(np.log2(N * rrmean / trr)))
 
     rr0 = rr_process(flo, fhi, flostd, fhistd,
-                     lfhfratio, hrmean, hrstd, sampfreqrr, Nrr)
+                     lfhfratio, hrmean, hrstd, sampfreqrr, Nrr, seed=seed)
 
     # upsample rr time series from 1 Hz to sfint Hz
     rr = interp(rr0, sfint)
@@ -189,12 +195,14 @@ def ecg_dynamic_template(width, sfecg=256, N=256, Anoise=0, hrmean=60,
     x0 = [1, 0, 0.04]
     tspan = np.arange(0, (Nt - 1) * dt, dt)
     args = (rrn, sfint, ti, ai, bi)
-    solv_ode = solve_ivp(ordinary_differential_equation, [tspan[0], tspan[-1]],
-                         x0, t_eval=np.arange(20.5, 21.5, 0.00001), args=args)
+    # only integrate up to the end of the template window and evaluate it
+    # at the width samples needed
+    t_start = 20.5
+    t_end = min(t_start + 1, tspan[-1])
+    t_eval = t_start + np.arange(width) / width
+    solv_ode = solve_ivp(ordinary_differential_equation, [tspan[0], t_end],
+                         x0, t_eval=t_eval[t_eval <= t_end], args=args)
     Y = (solv_ode.y)[2]
-
-    # if len(Y) > width:
-    #     z = squeeze_template(Y,125)
     return Y
 
 
@@ -237,7 +245,8 @@ def ordinary_differential_equation(t, x_equations, rr=None,
     return [dx1dt, dx2dt, dx3dt]
 
 
-def rr_process(flo, fhi, flostd, fhistd, lfhfratio, hrmean, hrstd, sfrr, n):
+def rr_process(flo, fhi, flostd, fhistd, lfhfratio, hrmean, hrstd, sfrr, n,
+               seed=None):
     """
     handy
     :param flo:
@@ -249,6 +258,8 @@ def rr_process(flo, fhi, flostd, fhistd, lfhfratio, hrmean, hrstd, sfrr, n):
     :param hrstd:
     :param sfrr:
     :param n:
+    :param seed: seed of the random phases, None for the global numpy
+        random state
     :return:
     """
     w1 = 2 * np.pi * flo
@@ -284,7 +295,10 @@ def rr_process(flo, fhi, flostd, fhistd, lfhfratio, hrmean, hrstd, sfrr, n):
     Hw0 = np.append(Hw0_half, np.flip(Hw0_half))
     Sw = (sfrr / 2) * (Hw0 ** .5)
 
-    ph0 = 2 * np.pi * np.random.rand(int(n / 2) - 1, 1)
+    # RandomState(seed) draws the same phases as np.random.seed(seed)
+    random_state = np.random if seed is None else \
+        np.random.RandomState(seed)
+    ph0 = 2 * np.pi * random_state.rand(int(n / 2) - 1, 1)
     # ph0 = 2 * np.pi * 0.001*np.arange(127).reshape(-1,1)
     ph = np.vstack((0, ph0, 0, -np.flip(ph0)))
 
@@ -1,12 +1,21 @@
 """R peak detection approaches for PPG and ECG"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
 import numpy as np
-from sklearn.cluster import KMeans
 from scipy import signal
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 
 from vital_sqi.preprocess.band_filter import BandpassFilter
-from vital_sqi.common.generate_template import ecg_dynamic_template
+from vital_sqi.common.template_cache import TemplateCache
 import warnings
-from ecgdetectors import Detectors, panPeakDetect
+from ecgdetectors import Detectors
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 ADAPTIVE_THRESHOLD = 1
 COUNT_ORIG_METHOD = 2
@@ -16,6 +25,10 @@ MOVING_AVERAGE_METHOD = 5
 DEFAULT_SCIPY = 6
 BILLAUER_METHOD = 7
 
+# QRS templates shared by the matched filter detectors
+TEMPLATE_CACHE = TemplateCache()
+
+
 class PeakDetector:
     """Various peak detection approaches getting from the paper
     Systolic Peak Detection in Acceleration Photoplethysmograms Measured
@@ -64,7 +77,8 @@ class PeakDetector:
 
             'mva': Frequency Bands Effects on QRS Detection.
 
-            'mtemp':
+            'mtemp': FIR matched filter with the QRS template of
+            generate_template, see matched_filter_detector.
 
             'pan_tompkins': A Real-Time QRS Detection Algorithm
 
@@ -80,7 +94,7 @@ class PeakDetector:
         if self.wave_type == 'ppg':
             warnings.warn("A ECG detectors is using on PPG waveform. "
                           "Output may produce incorrect result")
-        detector = Detectors(self.fs)
+        detector = _ecg_detectors(self.fs)
         if detector_type == 'hamilton':
             res = detector.hamilton_detector(s)
         elif detector_type == 'christov':
@@ -97,6 +111,118 @@ class PeakDetector:
             res = detector.pan_tompkins_detector(s)
         return np.array(res)
 
+    def ecg_detector_multilead(self, signals, detector_type="pan_tompkins",
+                               channel_axis=1, n_workers=None,
+                               executor='process', consensus=False,
+                               tolerance=0.05, min_leads=None):
+        """
+        Expose
+
+        ECG peak detection on every lead of a multi-channel recording,
+        e.g. the signals of ECG_reader, the leads being processed in
+        parallel.
+
+        Parameters
+        ----------
+        signals :
+            2-D array of the leads, a 1-D array is a single lead
+        detector_type :
+            detector of ecg_detector. Default = 'pan_tompkins'
+        channel_axis :
+            axis of the leads, 1 for the samples x channels signals of
+            ECG_reader. (Default value = 1)
+        n_workers :
+            int, number of threads or processes, 0 or 1 detects serially.
+            (Default value = None, number of leads up to the number of CPUs)
+        executor :
+            'process' or 'thread'. The thresholding of the detectors is a
+            Python loop holding the GIL, so only processes detect the
+            leads in parallel. Threads share the detectors and the signal,
+            which only pays off for detectors spending their time in numpy
+            and scipy. (Default value = 'process')
+        consensus :
+            bool, whether to fuse the leads peaks with consensus_peaks.
+            (Default value = False)
+        tolerance :
+            seconds, see consensus_peaks. (Default value = 0.05)
+        min_leads :
+            int, see consensus_peaks. (Default value = None)
+
+        Returns
+        -------
+        type
+            list of 1-D numpy array, the peaks of each lead, or with
+            consensus a 1-D numpy array of the fused peaks
+
+        """
+        assert executor in ('thread', 'process'), 'Unsupported executor'
+        signals = np.asarray(signals)
+        if signals.ndim == 1:
+            signals = signals[:, np.newaxis]
+            channel_axis = 1
+        leads = list(np.moveaxis(signals, channel_axis, 0))
+        if n_workers is None:
+            n_workers = min(len(leads), os.cpu_count() or 1)
+        tasks = [(self, lead, detector_type) for lead in leads]
+        if n_workers <= 1 or len(tasks) <= 1:
+            lead_peaks = [_detect_lead(task) for task in tasks]
+        else:
+            pool = ThreadPoolExecutor if executor == 'thread' \
+                else ProcessPoolExecutor
+            with pool(max_workers=n_workers) as workers:
+                lead_peaks = list(workers.map(_detect_lead, tasks))
+        if consensus:
+            return self.consensus_peaks(lead_peaks, tolerance, min_leads)
+        return lead_peaks
+
+    def consensus_peaks(self, lead_peaks, tolerance=0.05, min_leads=None):
+        """
+        handy
+        Fuse the R peaks detected on several leads. Peaks of the leads
+        closer than tolerance to each other are grouped as one beat, kept
+        when it is seen on at least min_leads leads, at the median of its
+        peaks.
+
+        Parameters
+        ----------
+        lead_peaks :
+            list of 1-D array, the peaks of each lead
+        tolerance :
+            seconds between the peaks of a beat on the different leads.
+            (Default value = 0.05)
+        min_leads :
+            int, number of leads a beat must be detected on.
+            (Default value = None, a majority of the leads)
+
+        Returns
+        -------
+        type
+            1-D numpy array of the fused peaks
+
+        """
+        if min_leads is None:
+            min_leads = len(lead_peaks) // 2 + 1
+        lengths = [len(peaks) for peaks in lead_peaks]
+        if sum(lengths) == 0:
+            return np.array([], dtype=int)
+        positions = np.concatenate(
+            [np.asarray(peaks, dtype=int) for peaks in lead_peaks])
+        leads = np.repeat(np.arange(len(lead_peaks)), lengths)
+        order = np.argsort(positions, kind='stable')
+        positions, leads = positions[order], leads[order]
+        # a beat ends where the gap to the next peak exceeds tolerance
+        new_beat = np.concatenate(
+            ([True], np.diff(positions) > tolerance * self.fs))
+        starts = np.flatnonzero(new_beat)
+        beats = np.cumsum(new_beat) - 1
+        counts = np.diff(np.append(starts, len(positions)))
+        n_leads = np.bincount(
+            np.unique(beats * len(lead_peaks) + leads) // len(lead_peaks),
+            minlength=len(starts))
+        medians = (positions[starts + (counts - 1) // 2] +
+                   positions[starts + counts // 2]) / 2
+        return np.round(medians[n_leads >= min_leads]).astype(int)
+
     def ppg_detector(self, s, detector_type=ADAPTIVE_THRESHOLD,
                      clusterer="kmean", preprocess=False, cubing=False):
         """
@@ -150,31 +276,42 @@ class PeakDetector:
 
         return peak_finalist, trough_finalist
 
-    def matched_filter_detector(self, unfiltered_ecg):
+    def matched_filter_detector(self, unfiltered_ecg, chunk_size=None,
+                                template_cache=None):
         """
         handy
         FIR matched filter using template of QRS complex.
-        Template provided in generate_template file
-        """
-        template = ecg_dynamic_template(self.fs)
-
-        f0 = 0.1 / self.fs
-        f1 = 48 / self.fs
+        Template provided in generate_template file, taken from a
+        TemplateCache. Uses the Pan and Tompkins thresholding method.
 
-        b, a = signal.butter(4, [f0 * 2, f1 * 2], btype='bandpass')
-
-        prefiltered_ecg = signal.lfilter(b, a, unfiltered_ecg)
-
-        matched_coeffs = template[::-1]  # time reversing template
-
-        # matched filter FIR filtering
-        detection = signal.lfilter(matched_coeffs, 1, prefiltered_ecg)
-        # squaring matched filter output
-        squared = detection * detection
-        squared[:len(template)] = 0
+        Parameters
+        ----------
+        unfiltered_ecg :
+            1-D array of the ECG signal
+        chunk_size :
+            samples filtered at once, None for the whole signal. Long
+            recordings can be processed in chunks with the same result.
+            (Default value = None)
+        template_cache :
+            TemplateCache of the QRS template,
+            default = None for the module TEMPLATE_CACHE
 
-        squared_peaks = panPeakDetect(squared, self.fs)
+        Returns
+        -------
+        type
+            list of the R peak indices
 
+        """
+        detector = StreamingMatchedFilterDetector(
+            fs=self.fs, template_cache=template_cache)
+        unfiltered_ecg = np.asarray(unfiltered_ecg, dtype=float).ravel()
+        if chunk_size is None:
+            chunk_size = max(len(unfiltered_ecg), 1)
+        squared_peaks = []
+        for start in range(0, len(unfiltered_ecg), chunk_size):
+            squared_peaks.extend(
+                detector.feed(unfiltered_ecg[start:start + chunk_size]))
+        squared_peaks.extend(detector.flush())
         return squared_peaks
 
     def compute_feature(self, s, local_extrema):
@@ -203,14 +340,18 @@ class PeakDetector:
         handy
         Method 1: using clustering technique
 
+        The local extrema are split in two groups on their compute_feature
+        values by a deterministic 2-means (see _two_means), the group of the
+        highest maximum (lowest minimum) holds the peaks (troughs).
+
         Parameters
         ----------
         s :
             The input signals
-        method :
-            param kwargs:
+        clusterer :
+            only 'kmean' is supported (Default value = 'kmean')
         **kwargs :
-
+            max_iter and tol passed to the 2-means solver
 
         Returns
         -------
@@ -220,54 +361,101 @@ class PeakDetector:
             and the second array is the troughs list
 
         """
+        assert clusterer == 'kmean', 'Unsupported clusterer ' + str(clusterer)
         # squarring doesnot work
         # s = np.array(s) ** 2
+        s = np.asarray(s)
         local_maxima = signal.argrelmax(s)[0]
         local_minima = signal.argrelmin(s)[0]
-        # local_minima_amplitude = s[local_minima]
-        # local_maxima_amplitude = s[local_maxima]
-        # lower, middle, upper = np.quantile(s, [0.25, 0.5, 0.75])
-
-        # clusterer = KMeans(kwargs)
-        clusterer = KMeans(n_clusters=2, init='k-means++', n_init=10,
-                           max_iter=300, tol=0.0001,
-                           precompute_distances='deprecated',
-                           verbose=0, random_state=None, copy_x=True,
-                           n_jobs='deprecated', algorithm='auto')
+        if len(local_maxima) < 2 or len(local_minima) < 2:
+            return local_maxima, local_minima
 
         convert_maxima = self.compute_feature(s, local_maxima)
-        clusterer.fit(convert_maxima)
-        systolic_group = clusterer.predict(
-            convert_maxima[np.argmax(s[local_maxima])].reshape(1, -1))
-        labels = clusterer.predict(convert_maxima)
-
-        systolic_peaks_idx = local_maxima[np.where(labels == systolic_group)]
+        labels = _two_means(convert_maxima, **kwargs)
+        systolic_group = labels[np.argmax(s[local_maxima])]
+        systolic_peaks_idx = local_maxima[labels == systolic_group]
 
         # ========================================================
         # The same with troughs
 
         convert_minima = self.compute_feature(s, local_minima)
-        clusterer.fit(convert_minima)
-        trough_group = clusterer.predict(
-            convert_minima[np.argmin(s[local_minima])].reshape(1, -1))
-        labels = clusterer.predict(convert_minima)
-
-        trough_idx = local_minima[np.where(labels == trough_group)]
+        labels = _two_means(convert_minima, **kwargs)
+        trough_group = labels[np.argmin(s[local_minima])]
+        trough_idx = local_minima[labels == trough_group]
 
         return systolic_peaks_idx, trough_idx
 
     def get_ROI(self, s, mva):
-        start_pos = []
-        end_pos = []
-        for idx in range(len(s) - 1):
-            if mva[idx] > s[idx] and mva[idx + 1] < s[idx + 1]:
-                start_pos.append(idx)
-            elif mva[idx] < s[idx] and mva[idx + 1] > s[idx + 1] \
-                    and len(start_pos) > len(end_pos):
-                end_pos.append(idx)
-        if len(start_pos) > len(end_pos):
-            end_pos.append(len(s) - 1)
-        return start_pos, end_pos
+        """
+        handy
+        Regions of interest, from each upward crossing of the moving
+        average by the signal to the next downward crossing.
+
+        Parameters
+        ----------
+        s :
+            1-D signal
+        mva :
+            moving average of s
+
+        Returns
+        -------
+        type
+            tuple of 1-D numpy array, the starts and ends (included) of
+            the regions
+
+        """
+        s = np.asarray(s)
+        starts, ends, _ = self._get_ROI_batch(s.reshape(1, -1),
+                                              np.reshape(mva, (1, -1)))
+        return starts, ends
+
+    def _get_ROI_batch(self, s, mva):
+        """
+        handy
+        get_ROI along the rows of 2-D s and mva, without a per-sample loop.
+
+        Returns
+        -------
+        type
+            tuple of 1-D numpy array, the starts, the ends (included) and
+            the row of every region, sorted by row then start
+        """
+        n_rows, n = s.shape
+        sign = _crossing_sign(mva - s)
+        up = (sign[:, :-1] > 0) & (sign[:, 1:] < 0)
+        down = (sign[:, :-1] < 0) & (sign[:, 1:] > 0)
+        # positions in the flattened (n_rows, n) array
+        up_pos = np.flatnonzero(np.pad(up, ((0, 0), (0, 1))))
+        down_pos = np.flatnonzero(np.pad(down, ((0, 0), (0, 1))))
+        row_start = np.arange(n_rows) * n
+        first_up = np.searchsorted(up_pos, row_start)
+        n_up = np.diff(np.append(first_up, len(up_pos)))
+        first_down = np.searchsorted(down_pos, row_start)
+        down_row = down_pos // n
+        # A down crossing closes a region only while more regions were
+        # opened than closed. With u_k the up crossings before the k-th
+        # down crossing of a row (from 1), the number closed after it is
+        # a_k = min(u_k, a_(k-1) + 1) = k + min(0, min_(i<=k) (u_i - i)).
+        k = np.arange(1, len(down_pos) + 1) - first_down[down_row]
+        u = np.searchsorted(up_pos, down_pos) - first_up[down_row]
+        # cumulative minimum restarted at each row, by offsetting rows
+        offset = down_row * (2 * n + 2)
+        running_min = offset - np.maximum.accumulate(offset - (u - k))
+        closed = k + np.minimum(0, running_min)
+        previous = np.where(k == 1, 0, np.roll(closed, 1))
+        end_pos = down_pos[closed > previous]
+        n_closed = np.bincount(end_pos // n, minlength=n_rows)
+        # a region still open at the end of a row ends at its last sample
+        still_open = n_up > n_closed
+        end_pos = np.sort(np.concatenate(
+            (end_pos, row_start[still_open] + n - 1)))
+        # regions pair the i-th start and i-th end of a row
+        n_regions = n_closed + still_open
+        up_rank = np.arange(len(up_pos)) - np.repeat(first_up, n_up)
+        start_pos = up_pos[up_rank < np.repeat(n_regions, n_up)]
+        rows = start_pos // n
+        return start_pos - rows * n, end_pos - rows * n, rows
 
     def detect_peak_trough_adaptive_threshold(self, s,
                                               adaptive_size=0.75,
@@ -279,23 +467,46 @@ class PeakDetector:
         :param overlap: overlapping ratio
         :return:
         """
+        return self.detect_peak_trough_adaptive_threshold_batch(
+            np.reshape(s, (1, -1)), adaptive_size, overlap, sliding)[0]
+
+    def detect_peak_trough_adaptive_threshold_batch(self, segments,
+                                                    adaptive_size=0.75,
+                                                    overlap=0, sliding=1):
+        """
+        Expose
+        detect_peak_trough_adaptive_threshold on many equal-length segments
+        at once, vectorized across segments.
+
+        :param segments: 2-D array, one segment per row
+        :param adaptive_size:
+        :param overlap: overlapping ratio
+        :return: list of tuple of 1-D numpy array, the peaks and troughs of
+            each segment
+        """
+        segments = np.asarray(segments)
+        n_rows, n = segments.shape
         # number of instances in the adaptive window
         adaptive_window = adaptive_size * self.fs
         adaptive_threshold = self.get_moving_average(
-            s, int(adaptive_window * 2 + 1))
-
-        start_ROIs, end_ROIs = self.get_ROI(s, adaptive_threshold)
-        peak_finalist = []
-        for start_ROI, end_ROI in zip(start_ROIs, end_ROIs):
-            region = s[start_ROI:end_ROI + 1]
-            peak_finalist.append(np.argmax(region) + start_ROI)
-
-        trough_finalist = []
-        for idx in range(len(peak_finalist) - 1):
-            region = s[peak_finalist[idx]:peak_finalist[idx + 1]]
-            trough_finalist.append(np.argmin(region) + peak_finalist[idx])
-
-        return peak_finalist, trough_finalist
+            segments, int(adaptive_window * 2 + 1), axis=1)
+
+        start_ROIs, end_ROIs, rows = self._get_ROI_batch(segments,
+                                                         adaptive_threshold)
+        flat = segments.ravel()
+        peak_pos = _segment_argmax(flat, rows * n + start_ROIs,
+                                   rows * n + end_ROIs + 1)
+        # troughs between consecutive peaks of the same segment
+        same_row = rows[:-1] == rows[1:]
+        trough_pos = _segment_argmin(flat, peak_pos[:-1][same_row],
+                                     peak_pos[1:][same_row])
+        n_peaks = np.bincount(rows, minlength=n_rows)
+        n_troughs = np.maximum(n_peaks - 1, 0)
+        peaks = np.split(peak_pos - rows * n, np.cumsum(n_peaks)[:-1])
+        trough_rows = np.repeat(np.arange(n_rows), n_troughs)
+        troughs = np.split(trough_pos - trough_rows * n,
+                           np.cumsum(n_troughs)[:-1])
+        return list(zip(peaks, troughs))
 
     def detect_peak_trough_default_scipy(self, s):
         peak_finalist = signal.find_peaks(s)[0]
@@ -326,35 +537,40 @@ class PeakDetector:
         """
         # squaring decrease the efficiency
         # s = np.array(s)**2
-
+        s = np.asarray(s)
         local_maxima = signal.argrelmax(s)[0]
         local_minima = signal.argrelmin(s)[0]
+        if len(local_maxima) == 0 or len(local_minima) < 2:
+            return np.array([], dtype=int), local_minima[:0]
 
         peak_threshold = np.quantile(s[local_maxima], 0.75) * 0.2
         trough_threshold = np.quantile(s[local_minima], 0.25) * 0.2
 
-        peak_shortlist = np.array([optima for optima in local_maxima
-                                   if s[optima] >= peak_threshold])
-        trough_shortlist = np.array([optima for optima in local_minima
-                                     if s[optima] <= trough_threshold])
-
-        peak_finalist = []
-        through_finalist = []
-        left_trough = trough_shortlist[0]
-        for i in range(1, len(trough_shortlist)):
-
-            right_trough = trough_shortlist[i]
-            peaks = [peak for peak in peak_shortlist
-                     if peak < right_trough and peak > left_trough]
-            if len(peaks) == 0:
-                left_trough = np.array([left_trough, right_trough])
-                [np.argmin([s[left_trough], s[right_trough]])]
-            else:
-                peak = peaks[np.argmax(s[peaks])]
-                peak_finalist.append(peak)
-                through_finalist.append(left_trough)
-                left_trough = right_trough
-        through_finalist.append(right_trough)
+        peak_shortlist = local_maxima[s[local_maxima] >= peak_threshold]
+        trough_shortlist = local_minima[s[local_minima] <= trough_threshold]
+        if len(trough_shortlist) < 2:
+            return np.array([], dtype=int), trough_shortlist
+
+        # peaks strictly between each pair of consecutive troughs
+        first_peak = np.searchsorted(peak_shortlist, trough_shortlist[:-1],
+                                     side='right')
+        last_peak = np.searchsorted(peak_shortlist, trough_shortlist[1:],
+                                    side='left')
+        has_peak = last_peak > first_peak
+        # Troughs with no peak in between are merged into one run, whose
+        # lowest (earliest on ties) trough is the left trough of the pulse
+        # closing the run.
+        run_start = np.flatnonzero(np.concatenate(([True], has_peak)))
+        run_id = np.cumsum(np.concatenate(([True], has_peak))) - 1
+        pulses = np.flatnonzero(has_peak)
+        left_trough = _segment_argmin(s[trough_shortlist],
+                                      run_start[run_id[pulses]], pulses + 1)
+        peak = _segment_argmax(s[peak_shortlist], first_peak[pulses],
+                               last_peak[pulses])
+
+        peak_finalist = peak_shortlist[peak]
+        through_finalist = np.append(trough_shortlist[left_trough],
+                                     trough_shortlist[-1])
         return peak_finalist, through_finalist
 
     def detect_peak_trough_slope_sum(self, s):
@@ -362,6 +578,11 @@ class PeakDetector:
         handy
         Method 3: analyze the slope sum to get local extreme
 
+        The slope sum function Z is the sum of the positive increments of
+        the signal over a window w, computed from a cumulative sum. Pulses
+        are accepted where Z crosses an adaptive threshold, and the onset
+        of each pulse is the start of its run of positive Z.
+
         Parameters
         ----------
         s :
@@ -369,67 +590,55 @@ class PeakDetector:
 
         Returns
         -------
+        type
+            tuple of 1-D numpy array
+            the first array is the peak list
+            and the second array is the onset (trough) list
 
         """
-        peak_finalist = []
-        trough_finalist = []
-        onset_list = []
+        s = np.asarray(s, dtype=float)
         """
         Here w is the length of the analysing window, which Zong et al. [25]
         approximate to be equal to 128 ms or 47 samples
         for the sampling frequency (fs) of 367 Hz
         """
-        w = 12
+        w = max(int(round(0.12 * self.fs)), 1)
+        half_window = max(int(round(0.15 * self.fs)), 1)
         N = len(s)
-        Z = []
-        n_range = np.arange(w + 1, N)
-
-        for n in n_range:
-            Zk = 0
-            for k in range((n - w), n):
-                delta_y_k = s[k] - s[k - 1]
-                Zk = Zk + max(0, delta_y_k)
-            Z.append(Zk)
-        Z = np.array(Z)
-
-        fs = 100
-        Z_threshold = 3 * np.mean(Z[:10 * fs])
-        threshold_base = Z_threshold
-
-        for n in range(len(Z)):
-            actual_threshold = threshold_base * 0.6
-            if Z[n] > actual_threshold:
-                left = n - 15
-                right = n + 15
-                if left < 0:
-                    left = 0
-                if right > len(Z):
-                    right = len(Z)
-                local_min = np.min(Z[left:right])
-                local_max = np.max(Z[left:right])
-                if (local_max - local_min) > local_min * 2:
-                    # Accept the pulse
-                    threshold_crossing_point = n
-                    onset = self.search_for_onset(
-                        Z, threshold_crossing_point, local_max)
-                    onset_list.append(onset)
-                    # peak_finalist.append(threshold_crossing_point+np.argmax())
-                # maximum Z[n] value for each pulse detected
-                threshold_base = local_max  # ?????
-
-        onset_list = np.array(list(set(onset_list)))
-        onset_list.sort()
-        for trough_idx in range(1, len(onset_list)):
-            left = onset_list[trough_idx - 1]
-            right = onset_list[trough_idx]
-            try:
-                peak_finalist.append(np.argmax(s[left:right]) + left)
-                trough_finalist.append(np.argmin(s[left:right]) + left)
-            except Exception as e:
-                print(e)
+        if N <= w + 1:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        # Z[j] = sum of max(0, s[k + 1] - s[k]) for k in [j, j + w)
+        upslope = np.concatenate(([0], np.cumsum(np.maximum(np.diff(s), 0))))
+        Z = upslope[w:N - 1] - upslope[:N - 1 - w]
+
+        local_max = maximum_filter1d(Z, 2 * half_window, mode='nearest')
+        local_min = minimum_filter1d(Z, 2 * half_window, mode='nearest')
+
+        # the threshold is reset to the local maximum of Z after each
+        # crossing, this recurrence is the only sequential step
+        threshold_base = 3 * np.mean(Z[:int(10 * self.fs)])
+        crossings = []
+        local_max_list = local_max.tolist()
+        for n, z in enumerate(Z.tolist()):
+            if z > threshold_base * 0.6:
+                crossings.append(n)
+                threshold_base = local_max_list[n]
+        crossings = np.array(crossings, dtype=int)
+        # Accept the pulse
+        crossings = crossings[(local_max[crossings] - local_min[crossings])
+                              > local_min[crossings] * 2]
+
+        # onset: first index of the run of positive Z holding the crossing
+        last_zero = np.maximum.accumulate(
+            np.where(Z > 0, -1, np.arange(len(Z))))[crossings]
+        onsets = np.where(last_zero >= 1, last_zero + 1, 0)
+        # Z[j] rises above 0 when the signal rises at sample j + w - 1
+        onset_list = np.unique(onsets) + w - 1
+
+        peak_finalist = _segment_argmax(s, onset_list[:-1], onset_list[1:])
         return peak_finalist, onset_list
 
-    def search_for_onset(Z, idx, local_max):
+    def search_for_onset(self, Z, idx, local_max):
         """
         handy
         Parameters
@@ -452,37 +661,49 @@ class PeakDetector:
                 return idx
         return idx + 1
 
-    def detect_peak_trough_moving_average_threshold(self, s):
+    def detect_peak_trough_moving_average_threshold(self, s, bandpass=True):
         """
         handy
         Method 4 (examine second derivative)
 
+        Two moving averages of the clipped and squared signal mark blocks
+        of interest, each block wide enough holds one systolic peak
+        (Elgendi et al., Systolic Peak Detection in Acceleration
+        Photoplethysmograms Measured from Emergency Responders in Tropical
+        Conditions). Windows are scaled to self.fs.
+
         Parameters
         ----------
         s :
-            return:
+            Input signal
+        bandpass :
+            remove the baseline with a 0.5 Hz zero-phase high-pass filter
+            before clipping (Default value = True)
 
         Returns
         -------
+        type
+            tuple of 1-D numpy array
+            the first array is the peak list
+            and the second array is the troughs list
 
         """
-        peak_finalist = []
-        through_finalist = []
-
+        s = np.asarray(s, dtype=float)
         # Bandpass filter
-        #filter = BandpassFilter()
-        #S = filter.signal_highpass_filter(s, 0.5, fs=100)
-        # S = butter_lowpass_filter(S,8,fs=100) 
-        # S = s
+        if bandpass:
+            filter = BandpassFilter(fs=self.fs)
+            S = filter.signal_highpass_filter(s, cutoff=0.5, order=2)
+        else:
+            S = s
         # Clipping the output by keeping the signal
         # above zero will produce signal Z
-        Z = np.array([np.max([0, z]) for z in S])
+        Z = np.maximum(S, 0)
         # Squaring suppressing the small differences
         # arising from the diastolic wave and noise
         y = Z ** 2
 
-        w1 = 12  # 111ms
-        w2 = 67  # 678ms
+        w1 = max(int(round(0.12 * self.fs)), 1)  # 120ms, 12 at 100 Hz
+        w2 = max(int(round(0.67 * self.fs)), 1)  # 670ms, 67 at 100 Hz
         # MA_peak
         ma_peak = self.get_moving_average(y, w1)
         # MA_beat
@@ -490,43 +711,26 @@ class PeakDetector:
         # Thresholding
         z_mean = np.mean(y)
         beta = 0.02
-        alpha = beta * z_mean + ma_beat
+        alpha = beta * z_mean
         thr1 = ma_beat + alpha
-        block_of_interest = np.zeros(len(thr1))
-        for i in range(len(ma_peak)):
-            if ma_peak[i] > thr1[i]:
-                block_of_interest[i] = 0.1
+        block_of_interest = ma_peak > thr1
 
         # Accept and Reject block of interest
         # If a block is wider than or equal to THR2,
         # it is classified as a systolic peak
         thr2 = w1
-        # index of the signal having boi == 0.1
-        BOI_idx = np.where(block_of_interest > 0)[0]
-        # the different of consequence BOI
-        BOI_diff = np.diff(BOI_idx)
-        # index where the block move to other block
-        BOI_width_idx = np.where(BOI_diff > 1)[0]
-
-        for i in range(len(BOI_width_idx)):
-            if i == 0:
-                BOI_width = BOI_width_idx[i]
-            else:
-                BOI_width = BOI_width_idx[i] - BOI_width_idx[i - 1]
-
-            if BOI_width >= thr2:
-                if i == 0:
-                    left_idx = 0
-                else:
-                    left_idx = BOI_width_idx[i - 1]
-                # left_idx = BOI_width_idx[np.max([0,i-1])]
-                right_idx = BOI_width_idx[i]
-                region = y[BOI_idx[left_idx]:BOI_idx[right_idx] + 1]
-                peak_finalist.append(BOI_idx[left_idx] + np.argmax(region))
+        edges = np.diff(np.concatenate(([0], block_of_interest.view(np.int8),
+                                        [0])))
+        block_start = np.flatnonzero(edges == 1)
+        block_end = np.flatnonzero(edges == -1)
+        wide = block_end - block_start >= thr2
+        peak_finalist = _segment_argmax(y, block_start[wide], block_end[wide])
+        through_finalist = _segment_argmin(s, peak_finalist[:-1],
+                                           peak_finalist[1:])
 
         return peak_finalist, through_finalist
 
-    def get_moving_average(self, q, w):
+    def get_moving_average(self, q, w, axis=-1):
         """
         handy
         Parameters
@@ -535,6 +739,8 @@ class PeakDetector:
 
         w :
 
+        axis :
+            axis of a N-D q along which to average (Default value = -1)
 
         Returns
         -------
@@ -542,8 +748,11 @@ class PeakDetector:
         """
         # shifting = np.ceil(w-w/2)-1
         # remaining = w-1-shifting
-        q_padded = np.pad(q, (w // 2, w - 1 - w // 2), mode='edge')
-        convole = np.convolve(q_padded, np.ones(w) / w, 'valid')
+        pad_width = [(0, 0)] * np.ndim(q)
+        pad_width[axis] = (w // 2, w - 1 - w // 2)
+        q_padded = np.pad(q, pad_width, mode='edge')
+        convole = np.apply_along_axis(np.convolve, axis, q_padded,
+                                      np.ones(w) / w, 'valid')
         return convole
 
     def detect_peak_trough_billauer(self, s, delta=0.1):
@@ -570,15 +779,16 @@ class PeakDetector:
         Eli Billauer, 3.4.05 (Explicitly not copyrighted).
         This function is released to the public domain; Any use is allowed.
 
+        The state machine is compiled with numba when it is installed, and
+        runs as a plain Python loop otherwise.
+
         Parameters
         ----------
-        v :
+        s :
             Vector of input signal to detect peaks
         delta : 
             Parameter for determining peaks and valleys. A point is considered a maximum peak if 
             it has the maximal value, and was preceded (to the left) by a value lower by delta.
-        x :
-            (Optional) Replace the indices of the resulting max and min vectors with corresponding x-values
 
         Returns
         -------
@@ -588,35 +798,558 @@ class PeakDetector:
             Array containing the minima points (valleys)
     
         """
-        maxtab = []
-        mintab = []
-        
-        x = np.arange(len(s))
-        v = np.asarray(s)
-        assert isscalar(delta), 'Input argument delta must be a scalar'
+        assert np.isscalar(delta), 'Input argument delta must be a scalar'
         assert delta > 0, 'Input argument delta must be positive'
+        v = np.asarray(s, dtype=float)
+        if _billauer_jit is not None:
+            return _billauer_jit(v, float(delta))
+        # plain Python floats are much faster to loop over than numpy scalars
+        return _billauer(v.tolist(), float(delta))
 
-        mn, mx = Inf, -Inf
-        mnpos, mxpos = NaN, NaN
-        lookformax = True
-        for i in np.arange(len(v)):
-            this = v[i]
-            if this > mx:
-                mx = this
-                mxpos = x[i]
-            if this < mn:
+
+class StreamingPeakDetector:
+    """Incremental version of PeakDetector.detect_peak_trough_adaptive_threshold
+    for signals arriving in packets.
+
+    Samples are kept in a ring buffer and the centered moving average of
+    the new samples is computed as in get_moving_average, so the cost of
+    feed is proportional to the packet size. A peak is confirmed once the
+    signal falls back below the moving average, i.e. about adaptive_size
+    seconds after it.
+
+    Parameters
+    ----------
+    fs :
+        sampling rate (Default value = 100)
+    adaptive_size :
+        half width of the moving average in seconds
+        (Default value = 0.75)
+    buffer_duration :
+        seconds of samples kept to locate peaks and troughs, longer beats
+        are searched in their last buffer_duration seconds only
+        (Default value = 10)
+
+    Examples
+    --------
+    >>> detector = StreamingPeakDetector(fs=100)
+    >>> for packet in packets:
+    ...     peaks, troughs = detector.feed(packet)
+    >>> peaks, troughs = detector.flush()
+
+    The concatenated outputs are the peaks and troughs
+    detect_peak_trough_adaptive_threshold finds on the whole signal.
+    """
+    def __init__(self, fs=100, adaptive_size=0.75, buffer_duration=10):
+        self.fs = fs
+        self.window = int(adaptive_size * fs * 2 + 1)
+        self.left = self.window // 2
+        self.right = self.window - 1 - self.left
+        self.capacity = max(int(buffer_duration * fs), 2 * self.window + 2)
+        self._kernel = np.ones(self.window) / self.window
+        self.reset()
+
+    def reset(self):
+        """Forget all samples, to start a new stream."""
+        self._ring = np.zeros(self.capacity)
+        self._n = 0
+        self._next = 0
+        self._last_sign = 0.0
+        self._starts = deque()
+        self._last_peak = None
+
+    def feed(self, samples):
+        """
+        Expose
+        Add samples to the stream.
+
+        Parameters
+        ----------
+        samples :
+            1-D array of the new samples
+
+        Returns
+        -------
+        type
+            tuple of 1-D numpy array, the newly confirmed peaks and troughs
+            as sample indices from the start of the stream
+
+        """
+        samples = np.asarray(samples, dtype=float).ravel()
+        peaks, troughs = [], []
+        # the moving average looks window samples back into the ring
+        step = self.capacity - self.window - 1
+        for chunk_start in range(0, len(samples), step):
+            chunk = samples[chunk_start:chunk_start + step]
+            positions = np.arange(self._n, self._n + len(chunk))
+            self._ring[positions % self.capacity] = chunk
+            self._n += len(chunk)
+            self._advance(self._n - 1 - self.right, peaks, troughs)
+        return np.array(peaks, dtype=int), np.array(troughs, dtype=int)
+
+    def flush(self):
+        """
+        Expose
+        End the stream: the moving average is completed by repeating the
+        last sample and an open region ends at the last sample. The
+        detector is reset afterwards.
+
+        Returns
+        -------
+        type
+            tuple of 1-D numpy array, the last peaks and troughs
+
+        """
+        peaks, troughs = [], []
+        if self._n > 0:
+            self._advance(self._n - 1, peaks, troughs)
+            if self._starts:
+                self._confirm(self._starts.popleft(), self._n - 1,
+                              peaks, troughs)
+        self.reset()
+        return np.array(peaks, dtype=int), np.array(troughs, dtype=int)
+
+    def _values(self, idx):
+        """Samples at the stream indices idx, the first and last sample
+        standing for the ones out of the stream."""
+        idx = np.clip(idx, 0, self._n - 1)
+        return self._ring[idx % self.capacity]
+
+    def _advance(self, last, peaks, troughs):
+        """Update the moving average up to index last and handle the
+        crossings of the signal it reveals."""
+        if last < self._next:
+            return
+        i = np.arange(self._next, last + 1)
+        # same convolution as the batch moving average, for the same
+        # rounding
+        mva = np.convolve(
+            self._values(np.arange(i[0] - self.left, last + self.right + 1)),
+            self._kernel, 'valid')
+        self._next = last + 1
+        # the sign before i[0] leads, so crossings at the packet edges are
+        # found
+        sign = _crossing_sign(np.concatenate(
+            ([self._last_sign], mva - self._values(i))))
+        self._last_sign = sign[-1]
+        base = i[0] - 1
+        up = np.flatnonzero((sign[:-1] > 0) & (sign[1:] < 0)) + base
+        down = np.flatnonzero((sign[:-1] < 0) & (sign[1:] > 0)) + base
+        events = np.concatenate((up, down))
+        is_up = np.arange(len(events)) < len(up)
+        for k in np.argsort(events, kind='stable'):
+            if is_up[k]:
+                self._starts.append(events[k])
+            elif self._starts:
+                self._confirm(self._starts.popleft(), events[k],
+                              peaks, troughs)
+
+    def _confirm(self, start, end, peaks, troughs):
+        """Peak of the region [start, end] and trough since the previous
+        peak."""
+        oldest = self._n - self.capacity
+        lo = max(start, oldest)
+        peak = lo + int(np.argmax(self._values(np.arange(lo, end + 1))))
+        if self._last_peak is not None and peak > self._last_peak:
+            lo = max(self._last_peak, oldest)
+            troughs.append(lo + int(np.argmin(
+                self._values(np.arange(lo, peak)))))
+        peaks.append(peak)
+        self._last_peak = peak
+
+
+class StreamingMatchedFilterDetector:
+    """Incremental version of PeakDetector.matched_filter_detector for
+    long recordings processed in chunks.
+
+    The band-pass filter carries its state across chunks and the matched
+    filter is applied by overlap-add FFT convolution, so the detection
+    signal is the one of the whole recording. The Pan and Tompkins
+    thresholding only visits its local maxima. The template and filter
+    coefficients are shared by the detectors of the same fs.
+
+    Parameters
+    ----------
+    fs :
+        sampling rate, above 96 Hz for the 48 Hz band-pass
+        (Default value = 256)
+    template_cache :
+        TemplateCache of the QRS template,
+        default = None for the module TEMPLATE_CACHE
+
+    Examples
+    --------
+    >>> detector = StreamingMatchedFilterDetector(fs=256)
+    >>> for chunk in chunks:
+    ...     peaks = detector.feed(chunk)
+    >>> peaks = detector.flush()
+    """
+    def __init__(self, fs=256, template_cache=None):
+        if template_cache is None:
+            template_cache = TEMPLATE_CACHE
+        self.fs = fs
+        self.sos = BandpassFilter(band_type="butter", fs=fs).signal_bypass(
+            (0.1, 48), 4, 3, 4, 40, btype='bandpass', output='sos')
+        # time reversed template
+        self.matched_coeffs = \
+            template_cache.get(3, int(round(fs)))[::-1]
+        self.reset()
+
+    def reset(self):
+        """Forget all samples, to start a new recording."""
+        self._n = 0
+        self._zi = np.zeros((self.sos.shape[0], 2))
+        self._tail = np.zeros(len(self.matched_coeffs) - 1)
+        self._last = np.empty(0)
+        # Pan and Tompkins state, the first signal peak is a sentinel
+        self._signal_peaks = [0]
+        self._peaks = []
+        self._peak_values = []
+        self._peaks_offset = 0
+        self._indexes = []
+        self._index = 0
+        self._spki = 0.0
+        self._npki = 0.0
+        self._threshold_i1 = 0.0
+        self._threshold_i2 = 0.0
+        self._rr_missed = 0
+        self._emitted = 1
+
+    def feed(self, samples):
+        """
+        Expose
+        Add samples to the recording.
+
+        Parameters
+        ----------
+        samples :
+            1-D array of the new ECG samples
+
+        Returns
+        -------
+        type
+            1-D numpy array, the newly detected R peaks as sample indices
+            from the start of the recording
+
+        """
+        samples = np.asarray(samples, dtype=float).ravel()
+        if len(samples) == 0:
+            return np.array([], dtype=int)
+        prefiltered_ecg, self._zi = signal.sosfilt(self.sos, samples,
+                                                   zi=self._zi)
+        # matched filter FIR filtering, the overlap is carried to the next
+        # chunk
+        detection = signal.oaconvolve(prefiltered_ecg, self.matched_coeffs)
+        detection[:len(self._tail)] += self._tail
+        self._tail = detection[len(samples):]
+        squared = detection[:len(samples)] ** 2
+        squared[:max(len(self.matched_coeffs) - self._n, 0)] = 0
+
+        # local maxima, the last sample waits for the next chunk
+        squared = np.concatenate((self._last, squared))
+        start = self._n - len(self._last)
+        self._n += len(samples)
+        self._last = squared[-2:]
+        is_peak = (squared[1:-1] > squared[:-2]) & \
+            (squared[1:-1] > squared[2:])
+        positions = np.flatnonzero(is_peak) + 1
+        for peak, value in zip((positions + start).tolist(),
+                               squared[positions].tolist()):
+            self._threshold(peak, value)
+        return self._emit()
+
+    def flush(self):
+        """
+        Expose
+        End the recording. The detector is reset afterwards.
+
+        Returns
+        -------
+        type
+            1-D numpy array, the last R peaks
+
+        """
+        peaks = self._emit()
+        self.reset()
+        return peaks
+
+    def _emit(self):
+        """Signal peaks found since the last call. They are final as a
+        missed peak is only inserted before the newest one when it is
+        found."""
+        peaks = self._signal_peaks[self._emitted:]
+        self._emitted = len(self._signal_peaks)
+        return np.array(peaks, dtype=int)
+
+    def _threshold(self, peak, value):
+        """Pan and Tompkins thresholding of one local maximum, as in
+        ecgdetectors.panPeakDetect."""
+        fs = self.fs
+        signal_peaks = self._signal_peaks
+        self._peaks.append(peak)
+        self._peak_values.append(value)
+        if value > self._threshold_i1 and \
+                (peak - signal_peaks[-1]) > 0.3 * fs:
+            signal_peaks.append(peak)
+            self._indexes = self._indexes[-1:] + [self._index]
+            self._spki = 0.125 * value + 0.875 * self._spki
+            if self._rr_missed != 0 and \
+                    signal_peaks[-1] - signal_peaks[-2] > self._rr_missed:
+                self._search_missed()
+            if len(signal_peaks) > 8:
+                # mean of the last 8 RR intervals
+                rr_ave = int((signal_peaks[-1] - signal_peaks[-9]) / 8)
+                self._rr_missed = int(1.66 * rr_ave)
+            # later searches start after this signal peak
+            drop = self._indexes[-1] + 1 - self._peaks_offset
+            if drop > 0:
+                del self._peaks[:drop], self._peak_values[:drop]
+                self._peaks_offset += drop
+        else:
+            self._npki = 0.125 * value + 0.875 * self._npki
+
+        self._threshold_i1 = self._npki + \
+            0.25 * (self._spki - self._npki)
+        self._threshold_i2 = 0.5 * self._threshold_i1
+        self._index += 1
+
+    def _search_missed(self):
+        """Highest maximum above threshold_i2 between the last two signal
+        peaks, inserted before the last one."""
+        min_distance = int(0.25 * self.fs)
+        signal_peaks = self._signal_peaks
+        lo = self._indexes[-2] + 1 - self._peaks_offset
+        hi = self._indexes[-1] - self._peaks_offset
+        best = None
+        for missed_peak, value in zip(self._peaks[lo:hi],
+                                      self._peak_values[lo:hi]):
+            if missed_peak - signal_peaks[-2] > min_distance and \
+                    signal_peaks[-1] - missed_peak > min_distance and \
+                    value > self._threshold_i2 and \
+                    (best is None or value > best[1]):
+                best = (missed_peak, value)
+        if best is not None:
+            signal_peaks.append(signal_peaks[-1])
+            signal_peaks[-2] = best[0]
+
+
+@lru_cache(maxsize=None)
+def _ecg_detectors(fs):
+    """Detectors of ecgdetectors, shared by the calls of the same fs."""
+    return Detectors(fs)
+
+
+def _detect_lead(task):
+    """ecg_detector on one lead, as a pool task."""
+    peak_detector, lead, detector_type = task
+    return peak_detector.ecg_detector(lead, detector_type)
+
+
+def _crossing_sign(diff):
+    """
+    handy
+    Sign of diff along the last axis, a run of zeros keeping the last
+    non-zero sign, so that a signal touching its moving average does not
+    cross it. Leading zeros stay zero.
+    """
+    sign = np.sign(diff)
+    last = np.where(sign != 0, np.arange(sign.shape[-1]), 0)
+    last = np.maximum.accumulate(last, axis=-1)
+    return np.take_along_axis(sign, last, axis=-1)
+
+
+def _segment_argmax(s, starts, ends):
+    """
+    handy
+    Index of the maximum of s in each segment [starts[i], ends[i]), as
+    np.argmax on every slice but in one vectorized pass.
+
+    Parameters
+    ----------
+    s :
+        1-D numpy array
+    starts :
+        array of segment starts
+    ends :
+        array of segment ends (excluded)
+
+    Returns
+    -------
+    1-D numpy array of indices in s
+    """
+    return _segment_arg_extreme(s, starts, ends, np.maximum)
+
+
+def _segment_argmin(s, starts, ends):
+    """
+    handy
+    Index of the minimum of s in each segment [starts[i], ends[i]),
+    see _segment_argmax.
+    """
+    return _segment_arg_extreme(s, starts, ends, np.minimum)
+
+
+def _segment_arg_extreme(s, starts, ends, ufunc):
+    """handy"""
+    starts = np.asarray(starts, dtype=int)
+    ends = np.asarray(ends, dtype=int)
+    if len(starts) == 0:
+        return np.array([], dtype=int)
+    s = np.asarray(s)
+    lengths = ends - starts
+    if np.any(lengths <= 0):
+        raise ValueError("attempt to get argmax of an empty sequence")
+    # reduceat over the interleaved (start, end) bounds, padded so that an
+    # end equal to len(s) is a valid index
+    bounds = np.empty(2 * len(starts), dtype=int)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    padded = np.append(s, s[-1:])
+    extremes = ufunc.reduceat(padded, bounds)[0::2]
+    # position of every sample of every segment, and its segment number
+    segment_id = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(len(segment_id)) - \
+        np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = starts[segment_id] + offsets
+    values = s[positions]
+    target = extremes[segment_id]
+    matches = values == target
+    if np.issubdtype(values.dtype, np.floating):
+        # np.argmax stops at the first NaN
+        matches = matches | (np.isnan(values) & np.isnan(target))
+    matched_segments = segment_id[matches]
+    first = np.flatnonzero(np.diff(matched_segments, prepend=-1) != 0)
+    return positions[matches][first]
+
+
+def _two_means(X, max_iter=300, tol=1e-12):
+    """
+    handy
+    Two-cluster k-means on the rows of X. The start is the exact best
+    split of the rows sorted on their first feature, every split point
+    being scored on the inertia of all the features with prefix sums in
+    O(n log n). Lloyd and Hartigan steps (single row moves, which Lloyd
+    iterations miss) then refine it until no move lowers the inertia, so
+    the result is deterministic. Replaces a scikit-learn KMeans fit,
+    which is far too costly to run on every segment.
+
+    Parameters
+    ----------
+    X :
+        2-D numpy array, one sample per row
+    max_iter :
+        maximum number of refining steps (Default value = 300)
+    tol :
+        stop when no step lowers the inertia by more than tol times the
+        total sum of squares of X (Default value = 1e-12)
+
+    Returns
+    -------
+    1-D numpy array of labels, 0 for the cluster of the row of lowest
+    first feature and 1 for the other
+    """
+    X = np.asarray(X, dtype=float)
+    n = len(X)
+    labels = np.zeros(n, dtype=int)
+    if n < 2 or np.all(X == X[0]):
+        return labels
+    order = np.argsort(X[:, 0], kind='stable')
+    sums = np.cumsum(X[order], axis=0)[:-1]
+    size = np.arange(1, n)
+    # inertia of the first size rows and of the others for every split, up
+    # to the sum of squares of X
+    inertia = - np.sum(sums ** 2, axis=1) / size - \
+        np.sum((X.sum(axis=0) - sums) ** 2, axis=1) / (n - size)
+    labels[order[np.argmin(inertia) + 1:]] = 1
+
+    total = X.sum(axis=0)
+    row_squares = np.sum(X ** 2, axis=1)
+    # a move must lower the inertia by more than tol times the scatter
+    tol = tol * (np.sum(row_squares) - np.sum(total ** 2) / n)
+    rows = np.arange(n)
+    for _ in range(max_iter):
+        n_1 = np.count_nonzero(labels)
+        counts = np.array([n - n_1, n_1])
+        sum_1 = labels @ X
+        centers = np.array([(total - sum_1) / counts[0], sum_1 / counts[1]])
+        distances = row_squares[:, None] - 2 * X @ centers.T + \
+            np.sum(centers ** 2, axis=1)
+        # Lloyd step, every row to its nearest center
+        new_labels = (distances[:, 1] < distances[:, 0]).astype(int)
+        if not np.array_equal(new_labels, labels) and \
+                0 < np.count_nonzero(new_labels) < n:
+            labels = new_labels
+            continue
+        # Hartigan step, moving one row from a cluster of n_a rows to one
+        # of n_b rows changes the inertia by
+        # n_b / (n_b + 1) d_b - n_a / (n_a - 1) d_a
+        n_a = counts[labels]
+        n_b = counts[1 - labels]
+        gain = n_a / np.maximum(n_a - 1, 1) * distances[rows, labels] - \
+            n_b / (n_b + 1) * distances[rows, 1 - labels]
+        gain[n_a == 1] = -np.inf
+        best = np.argmax(gain)
+        if gain[best] <= tol:
+            break
+        labels[best] = 1 - labels[best]
+    if labels[np.argmin(X[:, 0])] == 1:
+        labels = 1 - labels
+    return labels
+
+
+def _billauer(v, delta):
+    """
+    handy
+    Billauer's peakdet state machine, see
+    PeakDetector.detect_peak_trough_billauer. Written so that it can be
+    compiled by numba, or run on a list in plain Python.
+
+    Parameters
+    ----------
+    v :
+        array or list of float
+    delta :
+        float
+
+    Returns
+    -------
+    tuple of 1-D numpy array of the maxima and minima indices
+    """
+    n = len(v)
+    maxtab = np.empty(n, dtype=np.int64)
+    mintab = np.empty(n, dtype=np.int64)
+    n_max = 0
+    n_min = 0
+    mn = np.inf
+    mx = -np.inf
+    mnpos = 0
+    mxpos = 0
+    lookformax = True
+    for i in range(n):
+        this = v[i]
+        if this > mx:
+            mx = this
+            mxpos = i
+        if this < mn:
+            mn = this
+            mnpos = i
+        if lookformax:
+            if this < mx - delta:
+                maxtab[n_max] = mxpos
+                n_max += 1
                 mn = this
-                mnpos = x[i]   
-            if lookformax:
-                if this < mx-delta:
-                    maxtab.append(mxpos)
-                    mn = this
-                    mnpos = x[i]
-                    lookformax = False
-            else:
-                if this > mn+delta:
-                    mintab.append(mnpos)
-                    mx = this
-                    mxpos = x[i]
-                    lookformax = True
-        return array(maxtab) , array(mintab)
+                mnpos = i
+                lookformax = False
+        else:
+            if this > mn + delta:
+                mintab[n_min] = mnpos
+                n_min += 1
+                mx = this
+                mxpos = i
+                lookformax = True
+    return maxtab[:n_max], mintab[:n_min]
+
+
+if njit is not None:
+    _billauer_jit = njit(_billauer)
+else:
+    _billauer_jit = None
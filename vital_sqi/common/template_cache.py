@@ -0,0 +1,146 @@
+"""Caching the generated templates of the template matching SQIs"""
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from vital_sqi.common.generate_template import (
+        ppg_absolute_dual_skewness_template,
+        ppg_dual_double_frequency_template,
+        ppg_nonlinear_dynamic_system_template,
+        ecg_dynamic_template
+    )
+
+TEMPLATE_GENERATORS = {
+    0: ppg_nonlinear_dynamic_system_template,
+    1: ppg_dual_double_frequency_template,
+    2: ppg_absolute_dual_skewness_template,
+    3: ecg_dynamic_template,
+}
+"""Template generators by template_type, as in dtw_sqi."""
+
+
+class TemplateCache:
+    """Cache of the templates generated for the template matching SQIs.
+
+    Templates are keyed by template type, width and generator arguments
+    and kept in memory, the least recently used being dropped past maxsize
+    entries. With a cache_dir, they are also saved as .npy files and
+    reloaded by later processes. The random RR process of the ECG template
+    is drawn with seed, so that a cached ECG template is reproducible.
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of templates kept in memory.
+        (Default value = 128)
+    cache_dir : str
+        folder of the saved templates, None to keep them in memory only.
+        (Default value = None)
+    seed : int
+        seed of the ECG template, unless given to get.
+        (Default value = 0)
+
+    Examples
+    --------
+    >>> cache = TemplateCache(cache_dir='templates')
+    >>> reference = cache.get(0, 3000)
+    """
+    def __init__(self, maxsize=128, cache_dir=None, seed=0):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.seed = seed
+        self._templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, template_type, width, **kwargs):
+        """
+
+        Parameters
+        ----------
+        template_type : int
+            key of TEMPLATE_GENERATORS.
+        width : int
+            sample size of the template.
+        **kwargs :
+            arguments of the generator.
+
+        Returns
+        -------
+        str
+            the cache key.
+        """
+        if template_type == 3:
+            kwargs.setdefault('seed', self.seed)
+        arguments = sorted((name, np.asarray(value).tolist())
+                           for name, value in kwargs.items())
+        key = repr((template_type, int(width), arguments))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, template_type, width, **kwargs):
+        """
+        Template from the cache, generated on a miss.
+
+        Parameters
+        ----------
+        template_type : int
+            key of TEMPLATE_GENERATORS.
+        width : int
+            sample size of the template.
+        **kwargs :
+            arguments of the generator.
+
+        Returns
+        -------
+        1-D numpy array, read-only as it is shared by the callers
+        """
+        if template_type not in TEMPLATE_GENERATORS:
+            raise ValueError("Invalid template type")
+        if template_type == 3:
+            kwargs.setdefault('seed', self.seed)
+        key = self.get_key(template_type, width, **kwargs)
+        if key in self._templates:
+            self._templates.move_to_end(key)
+            self.hits = self.hits + 1
+            return self._templates[key]
+        self.misses = self.misses + 1
+        template = self._load(key)
+        if template is None:
+            template = np.asarray(
+                TEMPLATE_GENERATORS[template_type](width, **kwargs),
+                dtype=float).reshape(-1)
+            self._save(key, template)
+        template.setflags(write=False)
+        self._templates[key] = template
+        while len(self._templates) > self.maxsize:
+            self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        """Remove every template, from memory and cache_dir."""
+        self._templates.clear()
+        if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, key + '.npy')
+        if not os.path.isfile(path):
+            return None
+        try:
+            return np.load(path)
+        except Exception:
+            os.remove(path)
+            return None
+
+    def _save(self, key, template):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, key + '.npy')
+        tmp_path = path + '.tmp-' + str(os.getpid()) + '.npy'
+        np.save(tmp_path, template)
+        os.replace(tmp_path, path)
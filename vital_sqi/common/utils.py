@@ -1,7 +1,35 @@
 import numpy as np
 import datetime as dt
-from datetimerange import DateTimeRange
 import dateparser
+import pandas as pd
+
+# some common formats.
+_DATE_FORMATS = ['%Y-%m-%d',
+                 '%d-%m-%Y',
+                 '%d.%m.%Y',
+                 '%Y.%m.%d',
+                 '%d %b %Y',
+                 '%Y/%m/%d',
+                 '%d/%m/%Y']
+_DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S.%f',
+                     '%d-%m-%Y %H:%M:%S.%f',
+                     '%d.%m.%Y %H:%M:%S.%f',
+                     '%Y.%m.%d %H:%M:%S.%f',
+                     '%d %b %Y %H:%M:%S.%f',
+                     '%Y/%m/%d %H:%M:%S.%f',
+                     '%d/%m/%Y %H:%M:%S.%f',
+                     '%Y-%m-%d %I:%M:%S.%f',
+                     '%d-%m-%Y %I:%M:%S.%f',
+                     '%d.%m.%Y %I:%M:%S.%f',
+                     '%Y.%m.%d %I:%M:%S.%f',
+                     '%d %b %Y %I:%M:%S.%f',
+                     '%Y/%m/%d %I:%M:%S.%f',
+                     '%d/%m/%Y %I:%M:%S.%f']
+# pandas 2 warns on an inferred format unless parsing each element is asked
+_MIXED_FORMAT = {'format': 'mixed'} \
+    if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+
 def check_valid_signal(x):
     """Check whether signal is valid, i.e. an array_like numeric, or raise errors.
 
@@ -34,36 +62,88 @@ def check_valid_signal(x):
     return True
 
 
-def calculate_sampling_rate(timestamps):
-    """
+def calculate_sampling_rate(timestamps, return_jitter=False):
+    """Infer the sampling rate from the median step between timestamps.
+
+    Timestamps are converted to seconds in a single vectorized pass (see
+    `timestamps_to_seconds`). The median of the positive steps is robust to
+    dropped samples and clock jitter.
 
     Parameters
     ----------
-    x : array_like of timestamps, float (unit second)
+    timestamps : array_like
+        float (unit second), datetime64, datetime or datetime strings.
+    return_jitter : bool
+        if True, also return statistics of the steps between timestamps.
+        (Default value = False)
 
     Returns
     -------
-    float : sampling rate
+    float : sampling rate, None if it cannot be inferred.
+    dict : (only if return_jitter is True) median, mean, std, min and max
+        of the steps in seconds, and gap_ratio, the proportion of steps
+        longer than 1.5 times the median step.
     """
-    if isinstance(timestamps[0], float):
-        timestamps_second = timestamps
-    else:
-        try:
-            v_parse_datetime = np.vectorize(parse_datetime)
-            timestamps = v_parse_datetime(timestamps)
-            timestamps_second = []
-            timestamps_second.append(0)
-            for i in range(1, len(timestamps)):
-                timestamps_second.append((timestamps[i] - timestamps[
-                i - 1]).total_seconds())
-        except Exception:
-            sampling_rate = None
-            pass
+    try:
+        timestamps_second = timestamps_to_seconds(timestamps)
+    except Exception:
+        timestamps_second = np.array([])
     steps = np.diff(timestamps_second)
-    sampling_rate = round(1 / np.min(steps[steps != 0]))
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        sampling_rate = None
+        jitter = None
+    else:
+        median_step = np.median(steps)
+        sampling_rate = round(float(1 / median_step))
+        jitter = {'median_step': median_step,
+                  'mean_step': np.mean(steps),
+                  'std_step': np.std(steps),
+                  'min_step': np.min(steps),
+                  'max_step': np.max(steps),
+                  'gap_ratio': np.mean(steps > 1.5 * median_step)}
+    if return_jitter:
+        return sampling_rate, jitter
     return sampling_rate
 
 
+def timestamps_to_seconds(timestamps):
+    """Convert timestamps to float seconds in a single vectorized pass.
+
+    Numeric timestamps are taken as seconds. For datetime strings, the
+    format is detected once from the first timestamp and the whole array is
+    parsed with pandas. Strings in no known format fall back to pandas'
+    own inference.
+
+    Parameters
+    ----------
+    timestamps : array_like
+        float (unit second), datetime64, datetime or datetime strings.
+
+    Returns
+    -------
+    numpy.ndarray : float seconds. Datetimes are counted from the first
+        timestamp.
+    """
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype == object and \
+            isinstance(timestamps[0], (int, float, np.number)):
+        timestamps = timestamps.astype(float)
+    if np.issubdtype(timestamps.dtype, np.number):
+        return timestamps.astype(float)
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        parsed = timestamps.astype('datetime64[ns]')
+    else:
+        date_format = detect_datetime_format(str(timestamps[0]))
+        if date_format is not None:
+            parsed = pd.to_datetime(timestamps, format=date_format)
+        else:
+            parsed = pd.to_datetime(timestamps, **_MIXED_FORMAT)
+        parsed = np.asarray(parsed, dtype='datetime64[ns]')
+    nanoseconds = parsed.astype(np.int64)
+    return (nanoseconds - nanoseconds[0]) / 1e9
+
+
 def generate_timestamp(start_datetime, sampling_rate, signal_length):
     """
 
@@ -80,17 +160,46 @@ def generate_timestamp(start_datetime, sampling_rate, signal_length):
     -------
     list : list of timestamps with length equal to signal_length.
     """
-    number_of_seconds = (signal_length - 1)/sampling_rate
+    timestamps = generate_timestamp_array(start_datetime, sampling_rate,
+                                          signal_length)
+    return timestamps.astype('datetime64[us]').tolist()
+
+
+def generate_timestamp_array(start_datetime, sampling_rate, signal_length,
+                             unit='datetime64'):
+    """Generate timestamps in closed form, as start + arange / sampling_rate.
+
+    Parameters
+    ----------
+    start_datetime : datetime
+        if None, the current datetime is used.
+    sampling_rate : float
+
+    signal_length : int
+
+    unit : str
+        'datetime64' for a datetime64[ns] array, 'epoch' for float seconds
+        since the Unix epoch.
+        (Default value = 'datetime64')
+
+    Returns
+    -------
+    numpy.ndarray : timestamps with length equal to signal_length.
+    """
+    if not sampling_rate > 0 or not np.isfinite(sampling_rate):
+        raise Exception("Timestamp series generated is not valid, please "
+                        "check sampling rate.")
     if start_datetime is None:
         start_datetime = dt.datetime.now()
-    end_datetime = start_datetime + dt.timedelta(seconds=number_of_seconds)
-    time_range = DateTimeRange(start_datetime, end_datetime)
-    timestamps = []
-    for value in time_range.range(dt.timedelta(seconds=1/sampling_rate)):
-        timestamps.append(value)
+    start = np.datetime64(start_datetime, 'ns')
+    offsets = np.round(np.arange(signal_length) * (1e9 / sampling_rate))
+    timestamps = start + offsets.astype('timedelta64[ns]')
     if len(timestamps) != signal_length:
         raise Exception("Timestamp series generated is not valid, please "
                         "check sampling rate.")
+    if unit == 'epoch':
+        nanoseconds = timestamps.astype(np.int64)
+        return nanoseconds // 10 ** 9 + (nanoseconds % 10 ** 9) / 1e9
     return timestamps
 
 def parse_datetime(string, type='datetime'):
@@ -108,37 +217,9 @@ def parse_datetime(string, type='datetime'):
         datetime object of a time.
 
     """
-    # some common formats.
-    date_formats = ['%Y-%m-%d',
-                    '%d-%m-%Y',
-                    '%d.%m.%Y',
-                    '%Y.%m.%d',
-                    '%d %b %Y',
-                    '%Y/%m/%d',
-                    '%d/%m/%Y']
-    datime_formats = ['%Y-%m-%d %H:%M:%S.%f',
-                      '%d-%m-%Y %H:%M:%S.%f',
-                      '%d.%m.%Y %H:%M:%S.%f',
-                      '%Y.%m.%d %H:%M:%S.%f',
-                      '%d %b %Y %H:%M:%S.%f',
-                      '%Y/%m/%d %H:%M:%S.%f',
-                      '%d/%m/%Y %H:%M:%S.%f',
-                      '%Y-%m-%d %I:%M:%S.%f',
-                      '%d-%m-%Y %I:%M:%S.%f',
-                      '%d.%m.%Y %I:%M:%S.%f',
-                      '%Y.%m.%d %I:%M:%S.%f',
-                      '%d %b %Y %I:%M:%S.%f',
-                      '%Y/%m/%d %I:%M:%S.%f',
-                      '%d/%m/%Y %I:%M:%S.%f']
-    if type == 'date':
-        formats = date_formats
-    if type == 'datetime':
-        formats =  datime_formats
-    for f in formats:
-        try:
-            return datetime.strptime(string, f)
-        except:
-            pass
+    date_format = detect_datetime_format(string, type)
+    if date_format is not None:
+        return dt.datetime.strptime(string, date_format)
     try:
         return dateparser.parse(string)
     except:
@@ -146,5 +227,36 @@ def parse_datetime(string, type='datetime'):
                          '(https://docs.python.org/3/library/time.html), '
                          'e.g., `%d-%m-%Y`, eg. `24-01-2020`')
 
+
+def detect_datetime_format(string, type='datetime'):
+    """
+    Find the first common datetime format that parses a date string
+
+    Parameters
+    ----------
+    string : str
+        a date string.
+    type : str
+        'date' or 'datetime'.
+
+    Returns
+    -------
+    str
+        the strptime format, None if no common format matches.
+
+    """
+    if type == 'date':
+        formats = _DATE_FORMATS
+    else:
+        formats = _DATETIME_FORMATS
+    for f in formats:
+        try:
+            dt.datetime.strptime(string, f)
+            return f
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
 def parse_rule(name, source):
     pass
\ No newline at end of file
@@ -15,3 +15,6 @@ from vital_sqi.data.segment_split import (
 	split_to_subsegments
 	)
 from vital_sqi.data.signal_io import *
+from vital_sqi.data.signal_cache import (
+	SignalCache
+	)
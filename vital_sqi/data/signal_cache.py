@@ -0,0 +1,170 @@
+"""Caching decoded recordings in the memory-mapped NPY format"""
+import os
+import glob
+import shutil
+import hashlib
+import functools
+from vital_sqi.data.signal_io import NPY_writer, NPY_reader
+
+
+class SignalCache:
+    """Cache of the SignalSQI objects returned by the readers.
+
+    Entries are NPY_writer folders keyed by the reader, the source
+    path(s) with their modification time and size, and the reader
+    arguments, so editing a source file or changing an argument is a miss.
+    Hits are memory-mapped with NPY_reader. Once the cache grows over
+    max_size bytes, the least recently used entries are removed.
+
+    Parameters
+    ----------
+    cache_dir : str
+        folder of the cache entries.
+        (Default value = None, ~/.cache/vital_sqi)
+    max_size : int
+        maximum size of the cache, in bytes.
+        (Default value = 2 GiB)
+    enabled : bool
+        if False, read bypasses the cache and calls the reader directly.
+        (Default value = True)
+    mmap_mode : str
+        memory-map mode of the cached signals, as in NPY_reader.
+        (Default value = 'r')
+
+    Examples
+    --------
+    >>> cache = SignalCache()
+    >>> out = cache.read(ECG_reader, 'a103l', file_type='mit')
+    """
+    def __init__(self, cache_dir=None, max_size=2 * 1024 ** 3, enabled=True,
+                 mmap_mode='r'):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.cache',
+                                     'vital_sqi')
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.enabled = enabled
+        self.mmap_mode = mmap_mode
+
+    def get_key(self, reader, file_name, **kwargs):
+        """
+
+        Parameters
+        ----------
+        reader : callable
+            reader returning a SignalSQI object, e.g. ECG_reader or a
+            functools.partial of it.
+        file_name : str
+            path of the source file, or record name for mit files.
+        **kwargs :
+            arguments of the reader.
+
+        Returns
+        -------
+        str
+            the cache key.
+        """
+        if os.path.isfile(file_name):
+            sources = [file_name]
+        else:
+            sources = sorted(glob.glob(file_name + '.*'))
+        assert len(sources) > 0, 'File not found'
+        stats = []
+        for source in sources:
+            stat = os.stat(source)
+            stats.append((os.path.abspath(source), stat.st_mtime_ns,
+                          stat.st_size))
+        key = repr((_reader_name(reader), stats, sorted(kwargs.items())))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def read(self, reader, file_name, **kwargs):
+        """
+        Read a recording from the cache, or with the reader on a miss.
+
+        Parameters
+        ----------
+        reader : function
+            reader returning a SignalSQI object, e.g. ECG_reader.
+        file_name : str
+            path of the source file, or record name for mit files.
+        **kwargs :
+            arguments of the reader.
+
+        Returns
+        -------
+        object of class SignalSQI
+        """
+        if not self.enabled:
+            return reader(file_name, **kwargs)
+        path = os.path.join(self.cache_dir,
+                            self.get_key(reader, file_name, **kwargs))
+        if os.path.isdir(path):
+            try:
+                out = NPY_reader(path, mmap_mode=self.mmap_mode)
+                os.utime(path)
+                return out
+            except Exception:
+                shutil.rmtree(path, ignore_errors=True)
+        out = reader(file_name, **kwargs)
+        tmp_path = path + '.tmp-' + str(os.getpid())
+        NPY_writer(out, tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # written concurrently by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+        if os.path.isdir(path):
+            return NPY_reader(path, mmap_mode=self.mmap_mode)
+        return out
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        max_size.
+
+        Returns
+        -------
+        int
+            size of the cache, in bytes.
+        """
+        entries = []
+        for entry in self._entries():
+            size = sum(os.path.getsize(os.path.join(entry, f))
+                       for f in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total = total - size
+        return total
+
+    def clear(self):
+        """Remove every entry of the cache."""
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir)
+                if '.tmp-' not in name and
+                os.path.isdir(os.path.join(self.cache_dir, name))]
+
+
+def _reader_name(reader):
+    """Name of reader that is the same in every process, with the bound
+    arguments of a functools.partial."""
+    if isinstance(reader, functools.partial):
+        return (_reader_name(reader.func), reader.args,
+                sorted(reader.keywords.items()))
+    name = getattr(reader, '__qualname__',
+                   getattr(reader, '__name__', None))
+    if name is None:
+        raise ValueError('The reader must be a function, a functools.partial '
+                         'or define __name__, to be cached across processes')
+    return reader.__module__, name
@@ -5,7 +5,8 @@ import pandas as pd
 import datetime as dt
 import os
 import glob
-from vital_sqi.common import generate_timestamp, utils
+import pickle
+from vital_sqi.common import utils
 from vital_sqi.data.signal_sqi_class import SignalSQI
 
 
@@ -223,10 +224,13 @@ def ECG_writer(signal_sqi, file_name, file_type, info = None):
                    write_dir = '/'.join(file_name.split('/')[:-1]))
         return glob.glob(file_name + '.*')
     if file_type == 'csv':
-        timestamps = generate_timestamp(start_datetime, sampling_rate,
-                                        signals.shape[0])
-        signals = pd.DataFrame(np.hstack((np.array(timestamps).reshape(-1, 1),
-                                          signals)))
+        timestamps = utils.generate_timestamp_array(start_datetime,
+                                                    sampling_rate,
+                                                    signals.shape[0])
+        signals = np.asarray(signals).reshape(signals.shape[0], -1)
+        signals = pd.DataFrame(signals,
+                               columns = range(1, signals.shape[1] + 1))
+        signals.insert(0, 0, timestamps)
         signals.to_csv(path_or_buf = file_name, index = False, header = True)
         return os.path.isfile(file_name)
 
@@ -272,8 +276,133 @@ def PPG_reader(file_name, signal_idx, timestamp_idx, info_idx,
                       skipinitialspace = True,
                       skip_blank_lines = True)
     timestamps = tmp[timestamp_idx[0]]
+    start_datetime = _parse_ppg_start_datetime(start_datetime, timestamps[0])
+    if sampling_rate is None:
+        timestamps = _ppg_timestamps_to_seconds(timestamps.to_numpy(),
+                                                timestamp_unit)
+        sampling_rate = utils.calculate_sampling_rate(timestamps)
+    signals = tmp[signal_idx[0]].to_numpy()
+    info = tmp[info_idx].to_dict('list')
+    out = SignalSQI(signals = signals, wave_type = 'ppg',
+                    sampling_rate = sampling_rate,
+                    start_datetime = start_datetime,
+                    info = info)
+    return out
+
+
+def PPG_stream_reader(file_name, signal_idx, timestamp_idx, info_idx,
+                      chunk_duration = 3600, timestamp_unit = 'ms',
+                      sampling_rate = None, start_datetime = None,
+                      read_size = 100000):
+    """
+    Read a PPG csv file lazily, yielding fixed-duration chunks.
+
+    The file is parsed ``read_size`` rows at a time, so memory stays bounded
+    by the chunk size regardless of the recording length. The sampling rate
+    is inferred once, from the first rows read, and reused for every chunk.
+    The start datetime of each chunk is shifted from the recording start by
+    the number of samples already yielded.
+
+    Parameters
+    ----------
+    file_name : str
+        absolute path to ppg file
+
+    signal_idx : list
+        name of one column containing signal
+
+    timestamp_idx : list
+        name of one column containing timestamps
+
+    info_idx : list
+        name of the columns for other info
+
+    chunk_duration : float
+        duration of each chunk, in seconds. The last chunk may be shorter.
+         (Default value = 3600)
+    timestamp_unit : str
+        unit of timestamp, only 'ms' or 's' accepted
+         (Default value = 'ms')
+    sampling_rate : float
+        if None, sampling_rate can be inferred from the
+        timestamps
+         (Default value = None)
+    start_datetime : str
+        in '%Y-%m-%d '%H:%M:%S.%f' format
+         (Default value = None)
+    read_size : int
+        number of csv rows parsed per read
+         (Default value = 100000)
+
+    Returns
+    -------
+    generator of objects of class SignalSQI
+        ``info`` of each chunk is a dict of numpy arrays holding the info
+        columns and the raw timestamps of the chunk.
+
+    """
+    assert chunk_duration > 0, 'Chunk duration must be positive.'
+    cols = timestamp_idx + signal_idx + info_idx
+    reader = pd.read_csv(file_name,
+                         usecols = cols,
+                         skipinitialspace = True,
+                         skip_blank_lines = True,
+                         chunksize = read_size)
+    buffer = None
+    chunk_size = None
+    offset = 0
+    for block in reader:
+        block = {col: block[col].to_numpy()
+                 for col in timestamp_idx + signal_idx + info_idx}
+        if chunk_size is None:
+            start_datetime = _parse_ppg_start_datetime(
+                    start_datetime, block[timestamp_idx[0]][0])
+            if sampling_rate is None:
+                timestamps = _ppg_timestamps_to_seconds(
+                        block[timestamp_idx[0]], timestamp_unit)
+                sampling_rate = utils.calculate_sampling_rate(timestamps)
+                assert sampling_rate is not None, \
+                    'Sampling rate not found nor inferred from the first ' \
+                    'read_size rows, pass sampling_rate'
+            chunk_size = max(int(round(chunk_duration * sampling_rate)), 1)
+        if buffer is None:
+            buffer = block
+        else:
+            buffer = {col: np.concatenate((buffer[col], block[col]))
+                      for col in buffer}
+        while len(buffer[signal_idx[0]]) >= chunk_size:
+            chunk = {col: values[:chunk_size]
+                     for col, values in buffer.items()}
+            buffer = {col: values[chunk_size:]
+                      for col, values in buffer.items()}
+            yield _ppg_chunk(chunk, signal_idx, timestamp_idx, info_idx,
+                             sampling_rate, start_datetime, offset)
+            offset = offset + chunk_size
+    if buffer is not None and len(buffer[signal_idx[0]]) > 0:
+        yield _ppg_chunk(buffer, signal_idx, timestamp_idx, info_idx,
+                         sampling_rate, start_datetime, offset)
+
+
+def _ppg_chunk(chunk, signal_idx, timestamp_idx, info_idx, sampling_rate,
+               start_datetime, offset):
+    """Build the SignalSQI of one chunk starting at sample ``offset``."""
+    if start_datetime is not None:
+        chunk_start = start_datetime + \
+                      dt.timedelta(seconds = offset / sampling_rate)
+    else:
+        chunk_start = None
+    info = {col: chunk[col] for col in timestamp_idx + info_idx}
+    return SignalSQI(signals = chunk[signal_idx[0]], wave_type = 'ppg',
+                     sampling_rate = sampling_rate,
+                     start_datetime = chunk_start,
+                     info = info)
+
+
+def _parse_ppg_start_datetime(start_datetime, first_timestamp):
+    """Return the start datetime of a PPG recording, or None if not parsable.
+    """
     if start_datetime is None:
-        start_datetime = timestamps[0]
+        start_datetime = first_timestamp
     if isinstance(start_datetime, str):
         try:
             start_datetime = dt.datetime.strptime(start_datetime, '%Y-%m-%d '
@@ -283,23 +412,20 @@ def PPG_reader(file_name, signal_idx, timestamp_idx, info_idx,
             pass
     else:
         start_datetime = None
-    if sampling_rate is None:
-        if timestamp_unit is None:
-            raise Exception("Missing sampling_rate, not able to infer "
-                            "sampling_rate without timestamp_unit")
-        elif timestamp_unit == 'ms':
-            timestamps = timestamps / 1000
-        elif timestamp_unit != 's':
-            raise Exception("Timestamp unit must be either second (s) or "
-                            "millisecond (ms)")
-        sampling_rate = utils.calculate_sampling_rate(timestamps.to_numpy())
-    signals = tmp[signal_idx[0]].to_numpy()
-    info = tmp[info_idx].to_dict('list')
-    out = SignalSQI(signals = signals, wave_type = 'ppg',
-                    sampling_rate = sampling_rate,
-                    start_datetime = start_datetime,
-                    info = info)
-    return out
+    return start_datetime
+
+
+def _ppg_timestamps_to_seconds(timestamps, timestamp_unit):
+    """Convert PPG timestamps to seconds to infer the sampling rate."""
+    if timestamp_unit is None:
+        raise Exception("Missing sampling_rate, not able to infer "
+                        "sampling_rate without timestamp_unit")
+    elif timestamp_unit == 'ms':
+        timestamps = timestamps / 1000
+    elif timestamp_unit != 's':
+        raise Exception("Timestamp unit must be either second (s) or "
+                        "millisecond (ms)")
+    return timestamps
 
 
 def PPG_writer(signal_sqi, file_name, file_type = 'csv'):
@@ -318,12 +444,11 @@ def PPG_writer(signal_sqi, file_name, file_type = 'csv'):
     -------
     bool
     """
-    timestamps = utils.generate_timestamp(
+    timestamps = utils.generate_timestamp_array(
             start_datetime = signal_sqi.start_datetime,
             sampling_rate = signal_sqi.sampling_rate,
             signal_length = len(signal_sqi.signals))
     signals = signal_sqi.signals
-    timestamps = np.array(timestamps)
     out_df = pd.DataFrame({'time': timestamps, 'pleth': signals})
     if file_type == 'csv':
         out_df.to_csv(file_name, index = False, header = True)
@@ -331,6 +456,69 @@ def PPG_writer(signal_sqi, file_name, file_type = 'csv'):
             out_df.to_excel(file_name, index = False, header = True)
     return os.path.isfile(file_name)
 
+
+def NPY_writer(signal_sqi, file_name):
+    """
+    Persist a SignalSQI object to a folder that NPY_reader can memory-map.
+
+    The folder holds signals.npy, the signals in numpy .npy format, and
+    meta.pkl, a pickle of wave_type, sampling_rate, start_datetime, info and
+    sqi_indexes.
+
+    Parameters
+    ----------
+    signal_sqi : object of class SignalSQI
+
+    file_name : str
+        path of the folder to write, created if needed.
+
+    Returns
+    -------
+    bool
+    """
+    os.makedirs(file_name, exist_ok = True)
+    np.save(os.path.join(file_name, 'signals.npy'),
+            np.asanyarray(signal_sqi.signals))
+    meta = {'wave_type': signal_sqi.wave_type,
+            'sampling_rate': signal_sqi.sampling_rate,
+            'start_datetime': signal_sqi.start_datetime,
+            'info': signal_sqi.info,
+            'sqi_indexes': signal_sqi.sqi_indexes}
+    with open(os.path.join(file_name, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f)
+    return os.path.isfile(os.path.join(file_name, 'signals.npy'))
+
+
+def NPY_reader(file_name, mmap_mode = 'r'):
+    """
+    Reopen a SignalSQI object written by NPY_writer.
+
+    Parameters
+    ----------
+    file_name : str
+        path of the folder written by NPY_writer.
+
+    mmap_mode : str
+        memory-map mode of the signals, as in numpy.load: 'r', 'r+', 'c'
+        or None to load them in memory.
+         (Default value = 'r')
+
+    Returns
+    -------
+    object of class SignalSQI
+        signals is a numpy.memmap unless mmap_mode is None, so samples are
+        only read from disk when accessed.
+    """
+    assert os.path.isfile(os.path.join(file_name, 'signals.npy')) and \
+           os.path.isfile(os.path.join(file_name, 'meta.pkl')), \
+        'File not found'
+    signals = np.load(os.path.join(file_name, 'signals.npy'),
+                      mmap_mode = mmap_mode)
+    with open(os.path.join(file_name, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    out = SignalSQI(signals = signals, **meta)
+    return out
+
 # import os, tempfile
 # file_in = os.path.abspath('/Users/haihb/Documents/Work/Oucru/innovation'
 #                           '/vital_sqi/tests/test_data/example.edf')
@@ -1,6 +1,7 @@
 """
 Class containing signal, header and sqi
 """
+import numpy as np
 
 
 class SignalSQI:
@@ -96,3 +97,66 @@ class SignalSQI:
         """
         self.start_datetime = start_datetime
         return self
+
+    def get_segment(self, start, end):
+        """
+        Zero-copy view of the samples from start to end (excluded).
+
+        Parameters
+        ----------
+        start : int
+            index of the first sample
+        end : int
+            index after the last sample
+
+        Returns
+        -------
+        numpy.ndarray
+            a view on signals, also when signals is a numpy.memmap, so the
+            segment is read from disk only when accessed.
+        """
+        return self.signals[start:end]
+
+    def get_segments(self, segment_length, step=None):
+        """
+        Zero-copy view of the signal as equal-length segments.
+
+        Parameters
+        ----------
+        segment_length : int
+            number of samples per segment
+        step : int
+            number of samples between the starts of two segments. Segments
+            overlap if step < segment_length.
+            (Default value = None, same as segment_length)
+
+        Returns
+        -------
+        numpy.ndarray of shape (k, segment_length) for 1-D signals,
+        (k, segment_length, n) for signals with n channels.
+        k is the number of complete segments, trailing samples are left out.
+        """
+        if step is None:
+            step = segment_length
+        signals = np.asanyarray(self.signals)
+        if len(signals) < segment_length:
+            return signals[:0].reshape((0, segment_length)
+                                       + signals.shape[1:])
+        windows = np.lib.stride_tricks.sliding_window_view(
+                signals, segment_length, axis=0)[::step]
+        return np.moveaxis(windows, -1, 1)
+
+    def is_memmap(self):
+        """
+        Whether signals is backed by a memory-mapped file.
+
+        Returns
+        -------
+        bool
+        """
+        signals = self.signals
+        while isinstance(signals, np.ndarray):
+            if isinstance(signals, np.memmap):
+                return True
+            signals = signals.base
+        return False
@@ -7,11 +7,13 @@ edit, resample.
 """
 
 from vital_sqi.preprocess.band_filter import (
-	BandpassFilter
+	BandpassFilter,
+	StreamingFilter
 	)
 from vital_sqi.preprocess.preprocess_signal import (
 	tapering,
 	smooth,
 	scale_pattern,
+	scale_pattern_batch,
 	squeeze_template
 	)
\ No newline at end of file
@@ -1,8 +1,10 @@
 """ Filtering of raw signals by bandpass"""
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, lfilter, freqz
 from scipy import signal
 
+
 class BandpassFilter:
     def __init__(self,band_type="butter",fs=100):
         """
@@ -19,20 +21,24 @@ class BandpassFilter:
         self.band_type = band_type
         self.fs = fs
 
-    def signal_bypass(self,cutoff,order,a_pass,rp,rs,btype='high'):
-        nyq = 0.5 * self.fs
-        normal_cutoff = cutoff / nyq
-        if self.band_type == 'cheby1':
-            b, a = signal.cheby1(order, a_pass, normal_cutoff, btype=btype, analog=False)
-        elif self.band_type == 'cheby2':
-            b, a = signal.cheby2(order, a_pass, normal_cutoff, btype=btype, analog=False)
-        elif self.band_type == 'ellip':
-            b, a = signal.ellip(order, rp, rs, normal_cutoff, btype=btype, analog=False)
-        elif self.band_type == 'bessel':
-            b, a = signal.bessel(order, normal_cutoff, btype=btype, analog=False)
-        else:
-            b, a = signal.butter(order, normal_cutoff, btype=btype, analog=False)
-        return b, a
+    def signal_bypass(self,cutoff,order,a_pass,rp,rs,btype='high',
+                      output='ba'):
+        """
+            Design the filter, the coefficients are cached by
+            (band_type, fs, cutoff, order, a_pass, rp, rs, btype, output)
+            so that repeated calls do not redo the design.
+            :param output: 'ba' for the (b, a) polynomials,
+                'sos' for second-order sections
+            :return: tuple b, a or a 2-D array of sections
+            """
+        if np.ndim(cutoff) > 0:
+            # band edges, hashable for the cache
+            cutoff = tuple(np.ravel(cutoff).tolist())
+        design = _design_filter(self.band_type, self.fs, cutoff, order,
+                                a_pass, rp, rs, btype, output)
+        if output == 'sos':
+            return design.copy()
+        return tuple(coefficients.copy() for coefficients in design)
 
     def signal_lowpass_filter(self,data,cutoff,order=3,a_pass=3,rp=4,rs=40):
         """
@@ -48,8 +54,9 @@ class BandpassFilter:
                     Specified in decibels, as a positive number
             :return:
             """
-        b, a = self.signal_bypass(cutoff, order, a_pass, rp, rs,btype='low')
-        y = lfilter(b, a, data)
+        sos = self.signal_bypass(cutoff, order, a_pass, rp, rs, btype='low',
+                                 output='sos')
+        y = signal.sosfilt(sos, data)
         return y
 
     def signal_highpass_filter(self,data, cutoff, order=5, a_pass=3,rp=4,rs=40):
@@ -61,7 +68,120 @@ class BandpassFilter:
             :param order:
             :return:
             """
-        b, a = self.signal_bypass(cutoff, order,a_pass,rp,rs,btype='high')
-        y = signal.filtfilt(b, a, data)
+        sos = self.signal_bypass(cutoff, order, a_pass, rp, rs, btype='high',
+                                 output='sos')
+        y = signal.sosfiltfilt(sos, data)
         return y
 
+    def signal_bandpass_filter(self, data, cutoff, order=3, a_pass=3, rp=4,
+                               rs=40, zero_phase=False, axis=-1, out=None):
+        """
+            EXPOSE
+            Band pass filter designed as a single set of second-order
+            sections, replacing a high pass followed by a low pass.
+            :param data: list, array of input signal, N-D arrays are
+                filtered along axis (e.g. a batch of segments or the leads
+                of an ECG)
+            :param cutoff: tuple (low, high) of the band edges in Hz
+            :param order: order of each edge, the band pass has order 2*order
+            :param a_pass:
+            :param rp: The maximum ripple allowed below unity gain in the passband.
+                    Specified in decibels, as a positive number.
+            :param rs: The minimum attenuation required in the stop band.
+                    Specified in decibels, as a positive number
+            :param zero_phase: run the filter forward and backward
+                (sosfiltfilt) instead of once (sosfilt)
+            :param axis: axis of data along which to filter
+            :param out: optional array, same shape as data, receiving the
+                output. May be data itself.
+            :return: the filtered signal, out when given
+            """
+        low, high = cutoff
+        assert 0 < low < high < 0.5 * self.fs, \
+            'cutoff must be 0 < low < high < fs/2'
+        sos = self.signal_bypass((low, high), order, a_pass, rp, rs,
+                                 btype='band', output='sos')
+        if zero_phase:
+            y = signal.sosfiltfilt(sos, data, axis=axis)
+        else:
+            y = signal.sosfilt(sos, data, axis=axis)
+        if out is None:
+            return y
+        np.copyto(out, y)
+        return out
+
+
+class StreamingFilter(BandpassFilter):
+    def __init__(self, cutoff, btype='low', band_type="butter", fs=100,
+                 order=3, a_pass=3, rp=4, rs=40, axis=-1):
+        """
+        Causal filter applied chunk by chunk, carrying the filter state
+        from one chunk to the next so that the concatenated output is the
+        same as filtering the whole signal at once with sosfilt (as
+        signal_lowpass_filter does). A zero-phase filter needs the future
+        of the signal and cannot be streamed.
+
+        :param cutoff: cutoff in Hz, tuple (low, high) for btype 'band'
+        :param btype: 'low', 'high' or 'band'
+        :param band_type: see BandpassFilter
+        :param fs: sampling frequency
+        :param order:
+        :param a_pass:
+        :param rp:
+        :param rs:
+        :param axis: axis of the chunks along which to filter
+
+        """
+        super().__init__(band_type, fs)
+        self.axis = axis
+        self.sos = self.signal_bypass(cutoff, order, a_pass, rp, rs,
+                                      btype=btype, output='sos')
+        self.zi = None
+
+    def process(self, chunk):
+        """
+            EXPOSE
+            Filter the next chunk of the signal.
+            :param chunk: list, array of the next samples, N-D chunks must
+                keep the same shape apart from axis
+            :return: the filtered chunk
+            """
+        chunk = np.asarray(chunk, dtype=float)
+        if self.zi is None:
+            shape = list(chunk.shape)
+            shape[self.axis] = 2
+            self.zi = np.zeros([len(self.sos)] + shape)
+        y, self.zi = signal.sosfilt(self.sos, chunk, axis=self.axis,
+                                    zi=self.zi)
+        return y
+
+    def reset(self):
+        """Forget the filter state, to start a new signal."""
+        self.zi = None
+
+
+@lru_cache(maxsize=128)
+def _design_filter(band_type, fs, cutoff, order, a_pass, rp, rs, btype,
+                   output):
+    """Filter design behind BandpassFilter.signal_bypass, memoized."""
+    nyq = 0.5 * fs
+    normal_cutoff = np.asarray(cutoff) / nyq
+    if band_type == 'cheby1':
+        design = signal.cheby1(order, a_pass, normal_cutoff, btype=btype,
+                               analog=False, output=output)
+    elif band_type == 'cheby2':
+        design = signal.cheby2(order, a_pass, normal_cutoff, btype=btype,
+                               analog=False, output=output)
+    elif band_type == 'ellip':
+        design = signal.ellip(order, rp, rs, normal_cutoff, btype=btype,
+                              analog=False, output=output)
+    elif band_type == 'bessel':
+        design = signal.bessel(order, normal_cutoff, btype=btype,
+                               analog=False, output=output)
+    else:
+        design = signal.butter(order, normal_cutoff, btype=btype,
+                               analog=False, output=output)
+    # the cached arrays are shared by every caller
+    for coefficients in [design] if output == 'sos' else design:
+        coefficients.setflags(write=False)
+    return design
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 from scipy import signal
 
@@ -18,37 +20,81 @@ def tapering(signal_data,window=None,shift_min_to_zero=True):
     signal_data_tapered = np.array(window) * (signal_data)
     return np.array(signal_data_tapered)
 
-def smooth(x,window_len=5,window='flat'):
+SMOOTH_WINDOWS = {
+    'flat': lambda window_len: np.ones(window_len, 'd'),  # moving average
+    'hanning': np.hanning,
+    'hamming': np.hamming,
+    'bartlett': np.bartlett,
+    'blackman': np.blackman,
+}
+"""Window functions accepted by smooth, by name. A window added here is
+picked up by smooth."""
+
+# from this kernel length on, convolving with the FFT is faster
+FFT_WINDOW_LEN = 64
+
+def smooth(x,window_len=5,window='flat',axis=-1,method='auto'):
     """
     expose
-    :param x:
-    :param window_len:
-    :param window:
-    :return:
+    Convolve x with the normalised window, keeping its length
+    (np.convolve mode 'same').
+    :param x: list, array, N-D arrays are smoothed along axis
+    :param window_len: length of the window, x is returned as is below 3
+    :param window: name of the window in SMOOTH_WINDOWS
+    :param axis: axis of x along which to smooth
+    :param method: 'direct', 'fft' or 'auto' to use the FFT from
+        FFT_WINDOW_LEN on
+    :return: the smoothed signal
     """
     x = np.array(x)
-    if x.ndim != 1:
-        raise(ValueError, "smooth only accepts 1 dimension arrays.")
+    if x.ndim == 0:
+        raise ValueError("smooth only accepts arrays of at least 1 dimension.")
 
-    if x.size < window_len:
-        raise(ValueError, "Input vector needs to be bigger than window size.")
+    if x.shape[axis] < window_len:
+        raise ValueError("Input vector needs to be bigger than window size.")
 
     if window_len < 3:
         return x
 
-    if not window in ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']:
-        raise(ValueError, "Window is on of 'flat', 'hanning', 'hamming', 'bartlett', 'blackman'")
+    if not window in SMOOTH_WINDOWS:
+        raise ValueError("Window is one of " +
+                         ", ".join(repr(name) for name in SMOOTH_WINDOWS))
 
-    s = np.r_[x[window_len - 1:0:-1], x, x[-2:-window_len - 1:-1]]
-    # print(len(s))
-    if window == 'flat':  # moving average
-        w = np.ones(window_len, 'd')
-    else:
-        w = eval('np.' + window + '(window_len)')
+    if method not in ['auto', 'direct', 'fft']:
+        raise ValueError("Method is one of 'auto', 'direct', 'fft'")
 
-    # y = np.convolve(w / w.sum(), s, mode='valid')
-    y = np.convolve(w / w.sum(), x, mode='same')
-    return y
+    w = _smooth_kernel(window, window_len)
+    if method == 'fft' or (method == 'auto' and window_len >= FFT_WINDOW_LEN):
+        shape = [1] * x.ndim
+        shape[axis] = window_len
+        return signal.fftconvolve(x, w.reshape(shape), mode='same',
+                                  axes=axis)
+    if x.ndim == 1:
+        # y = np.convolve(w / w.sum(), s, mode='valid')
+        return np.convolve(w, x, mode='same')
+    # one shifted product per tap, over all the other axes at once
+    x = np.moveaxis(x, axis, -1)
+    n = x.shape[-1]
+    offset = (window_len - 1) // 2
+    pad_width = [(0, 0)] * (x.ndim - 1) + \
+        [(window_len - 1 - offset, offset)]
+    x_padded = np.pad(x.astype(float), pad_width)
+    y = np.zeros(x.shape)
+    for k in range(window_len):
+        start = window_len - 1 - k
+        y += w[k] * x_padded[..., start:start + n]
+    return np.moveaxis(y, -1, axis)
+
+@lru_cache(maxsize=64)
+def _smooth_kernel(window,window_len):
+    """
+    handy
+    Window of smooth normalised to sum 1, cached by name and length.
+    """
+    w = np.asarray(SMOOTH_WINDOWS[window](window_len), dtype=float)
+    w = w / w.sum()
+    w.setflags(write=False)
+    return w
 
 def scale_pattern(s,window_size):
     """
@@ -61,17 +107,14 @@ def scale_pattern(s,window_size):
     :param window_size:
     :return:
     """
-    scale_res = []
+    s = np.asarray(s)
     if len(s) == window_size:
         return np.array(s)
     if len(s)<window_size:
         #spanning the signal
         span_ratio = (window_size/len(s))
-        for idx in range(0,int(window_size)):
-            if idx-span_ratio<0:
-                scale_res.append(s[0])
-            else:
-                scale_res.append(np.mean(s[int(idx/span_ratio)]))
+        idx = np.arange(int(window_size))
+        scale_res = s[(idx/span_ratio).astype(int)]
     else:
         scale_res = squeeze_template(s, window_size)
 
@@ -80,6 +123,33 @@ def scale_pattern(s,window_size):
     smmoothed_scale_res = smooth(scale_res)
     return np.array(smmoothed_scale_res)
 
+def scale_pattern_batch(beats,window_size):
+    """
+    expose
+    scale_pattern on many beats of different lengths at once, e.g. to
+    average beats into a template.
+
+    :param beats: list of 1-D arrays
+    :param window_size: common width of the output
+    :return: 2-D array, one rescaled beat per row
+    """
+    window_size = int(window_size)
+    lengths = np.array([len(beat) for beat in beats])
+    if len(lengths) == 0:
+        return np.empty((0, window_size))
+    flat = np.concatenate([np.asarray(beat, dtype=float) for beat in beats])
+    offsets = (np.cumsum(lengths) - lengths)[:, None]
+    # spanning the shorter beats
+    span_ratio = (window_size/lengths)[:, None]
+    span_pos = (np.arange(window_size)/span_ratio).astype(int)
+    spanned = flat[offsets + np.minimum(span_pos, lengths[:, None] - 1)]
+    # squeezing the longer ones
+    squeezed = _squeeze(flat, offsets, lengths[:, None], window_size)
+    longer = (lengths > window_size)[:, None]
+    scale_res = np.where(longer, squeezed, spanned)
+    smoothed = smooth(scale_res, axis=1)
+    return np.where((lengths == window_size)[:, None], scale_res, smoothed)
+
 def squeeze_template(s,width):
     """
     handy
@@ -88,19 +158,24 @@ def squeeze_template(s,width):
     :return:
     """
     s = np.array(s)
-    total_len = len(s)
+    return _squeeze(s, 0, len(s), int(width))
+
+def _squeeze(flat,offsets,lengths,width):
+    """
+    handy
+    Mean of the samples within span_unit of each of width evenly spaced
+    centroids, for the signals of the given lengths stored from offsets in
+    flat. The windows hold 4 samples (5 when centroid+span_unit rounds up),
+    which are gathered and summed in the order np.mean would.
+    """
     span_unit = 2
-    out_res = []
-    for i in range(int(width)):
-        if i == 0:
-            centroid = (total_len/width)*i
-        else:
-            centroid = (total_len/width)*i
-        left_point = int(centroid)-span_unit
-        right_point = int(centroid+span_unit)
-        if left_point <0:
-            left_point=0
-        if right_point >len(s):
-            left_point=len(s)
-        out_res.append(np.mean(s[left_point:right_point]))
-    return np.array(out_res)
\ No newline at end of file
+    lengths = np.asarray(lengths)
+    centroid = (lengths/width)*np.arange(width)
+    left_point = np.maximum(centroid.astype(int)-span_unit, 0)
+    right_point = np.minimum((centroid+span_unit).astype(int), lengths)
+    taps = np.arange(2*span_unit+1)
+    positions = left_point[..., None] + taps
+    inside = positions < right_point[..., None]
+    idx = np.asarray(offsets)[..., None] + np.where(inside, positions, 0)
+    values = np.where(inside, flat[idx], 0)
+    return values.sum(axis=-1)/inside.sum(axis=-1)
@@ -9,7 +9,9 @@ A subpackage for signal quality index calculation, including:
 """
 
 from vital_sqi.sqi.dtw_sqi import (
-	dtw_sqi
+	dtw_sqi,
+	dtw_sqi_batch,
+	beat_template_sqi
 	)
 from vital_sqi.sqi.standard_sqi import (
 	perfusion_sqi,
@@ -18,5 +20,9 @@ from vital_sqi.sqi.standard_sqi import (
 	entropy_sqi,
 	signal_to_noise_sqi,
 	zero_crossings_rate_sqi,
-	mean_crossing_rate_sqi
+	mean_crossing_rate_sqi,
+	batch_standard_sqi
+	)
+from vital_sqi.sqi.parallel_sqi import (
+	parallel_sqi
 	)
\ No newline at end of file
@@ -1,28 +1,29 @@
 import numpy as np
-import sys
-import os
-if bool(getattr(sys, 'ps1', sys.flags.interactive)):
-    old_stdout = sys.stdout
-    sys.stdout = open(os.devnull, 'w')
-    from dtw import dtw
-    sys.stdout = old_stdout
-else:
-    from dtw import dtw
-
-from vital_sqi.common.generate_template import (
-        ppg_absolute_dual_skewness_template,
-        ppg_dual_double_frequency_template,
-        ppg_nonlinear_dynamic_system_template,
-        ecg_dynamic_template
-    )
+
+from vital_sqi.common.template_cache import TemplateCache
+from vital_sqi.common.rpeak_detection import PeakDetector, ADAPTIVE_THRESHOLD
 from vital_sqi.common.utils import check_valid_signal
+from vital_sqi.preprocess.preprocess_signal import scale_pattern, \
+    scale_pattern_batch
+
+# templates shared by the dtw_sqi calls without a template_cache
+TEMPLATE_CACHE = TemplateCache()
 
+# bytes of step directions held at once by dtw_sqi_batch
+DTW_MEMORY = 2 ** 27
 
-def dtw_sqi(x, template_type=0):
+
+def dtw_sqi(x, template_type=0, template_cache=None, window_type=None,
+            window_size=None):
     """Using DTW to get the mapping point distance between a signal and its
     template. The DTW SQI is the ratio of the distance sum to
     the trace of cost matrix. The closer to 1 the better SQI.
 
+    The alignment is the asymmetric, open-begin and open-end one of
+    dtw-python's dtw(x, reference, step_pattern='asymmetric',
+    open_begin=True, open_end=True), computed row by row without the cost
+    matrix.
+
     Parameters
     ----------
     x :
@@ -34,6 +35,16 @@ def dtw_sqi(x, template_type=0):
         2: ppg_nonlinear_dynamic_system_template,
         3: ecg_dynamic_template
         default = 0
+    template_cache :
+        TemplateCache the template is taken from,
+        default = None for the module TEMPLATE_CACHE
+    window_type :
+        None, 'sakoechiba' or 'itakura', global constraint on the
+        alignment as in dtw-python, memory and time are then
+        proportional to the window area.
+        default = None
+    window_size :
+        int, half width of the 'sakoechiba' band
 
     Returns
     -------
@@ -42,26 +53,279 @@ def dtw_sqi(x, template_type=0):
     check_valid_signal(x)
     if template_type > 3 or type(template_type) != int:
         raise ValueError("Invalid template type")
-    if template_type == 0:
-        reference = ppg_nonlinear_dynamic_system_template(len(x)).reshape(-1)
-    elif template_type == 1:
-        reference = ppg_dual_double_frequency_template(len(x))
-    if template_type == 2:
-        reference = ppg_absolute_dual_skewness_template(len(x))
-    if template_type == 3:
-        reference = ecg_dynamic_template(len(x))
-    alignmentOBE = dtw(x, reference, keep_internals=True,
-                       step_pattern='asymmetric', open_end=True,
-                       open_begin=True)
-    match_distance = []
-    for i in range(len(alignmentOBE.index2)):
-        match_distance.append(
-                alignmentOBE.costMatrix[i][alignmentOBE.index2[i]]
-                )
-    trace = alignmentOBE.costMatrix.trace()
-    if trace == 0:
+    if template_cache is None:
+        template_cache = TEMPLATE_CACHE
+    reference = template_cache.get(template_type, len(x))
+    match_distance, trace = _dtw_open_asymmetric(
+        np.asarray(x, dtype=float).reshape(1, -1), reference,
+        window_type, window_size)
+    if trace[0] == 0:
         ratio = float(1)
     else:
-        ratio = float(np.sum(match_distance)/trace)
+        ratio = float(match_distance[0]/trace[0])
 
     return ratio
+
+
+def dtw_sqi_batch(segments, template_type=0, template_cache=None,
+                  window_type=None, window_size=None):
+    """
+    Expose
+    dtw_sqi of many equal-length segments against the same template,
+    aligned together.
+
+    Parameters
+    ----------
+    segments :
+        2-D array, one segment per row
+    template_type :
+        int, see dtw_sqi
+    template_cache :
+        TemplateCache, see dtw_sqi
+    window_type :
+        None, 'sakoechiba' or 'itakura', see dtw_sqi
+    window_size :
+        int, see dtw_sqi
+
+    Returns
+    -------
+    1-D numpy array of the SQI of each segment
+    """
+    segments = np.asarray(segments, dtype=float)
+    if segments.ndim != 2:
+        raise ValueError("segments must be a 2-D array")
+    if template_type > 3 or type(template_type) != int:
+        raise ValueError("Invalid template type")
+    if template_cache is None:
+        template_cache = TEMPLATE_CACHE
+    n_rows, n = segments.shape
+    reference = template_cache.get(template_type, n)
+    lo, hi = _window_bounds(n, len(reference), window_type, window_size)
+    width = max(int(np.max(hi - lo)) + 1, 1)
+    chunk_size = max(DTW_MEMORY // (n * width), 1)
+    ratios = []
+    for start in range(0, n_rows, chunk_size):
+        match_distance, trace = _dtw_open_asymmetric(
+            segments[start:start + chunk_size], reference, window_type,
+            window_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios.append(np.where(trace == 0, 1.0, match_distance/trace))
+    if len(ratios) == 0:
+        return np.array([])
+    return np.concatenate(ratios)
+
+
+def beat_template_sqi(x, sampling_rate=100, template_type=0, width=100,
+                      method='correlation', template=None,
+                      detector_type=ADAPTIVE_THRESHOLD, template_cache=None,
+                      window_size=None):
+    """
+    Expose
+    Template matching SQI computed beat by beat. The segment is split into
+    beats at the troughs of PeakDetector.ppg_detector, every beat is
+    rescaled to width samples with scale_pattern and min-max normalised,
+    then all the beats are compared with the template at once.
+
+    Parameters
+    ----------
+    x :
+        array_like, signal containing int or float values.
+    sampling_rate :
+        int, sampling rate of x, for the peak detector.
+        default = 100
+    template_type :
+        int, synthetic template as in dtw_sqi, or 'average' for the mean
+        beat of x.
+        default = 0
+    width :
+        int, sample size of the rescaled beats.
+        default = 100
+    method :
+        'correlation' for the Pearson correlation of each beat with the
+        template, 'dtw' for the dtw_sqi ratio of each beat.
+        default = 'correlation'
+    template :
+        array_like, template used instead of template_type, e.g. an
+        average beat kept across segments. Rescaled to width if needed.
+        default = None
+    detector_type :
+        int, PPG detector splitting the beats.
+        default = ADAPTIVE_THRESHOLD
+    template_cache :
+        TemplateCache, see dtw_sqi
+    window_size :
+        int, half width of a Sakoe-Chiba band for method 'dtw'.
+        default = None, no band
+
+    Returns
+    -------
+    tuple of a dict and a 1-D numpy array, the mean, median, std and min
+    of the beat scores with the number of beats, and the score of each beat
+    """
+    check_valid_signal(x)
+    if method not in ['correlation', 'dtw']:
+        raise ValueError("Invalid method")
+    x = np.asarray(x, dtype=float)
+    detector = PeakDetector(wave_type='ppg', fs=sampling_rate)
+    _, troughs = detector.ppg_detector(x, detector_type=detector_type)
+    troughs = np.asarray(troughs, dtype=int)
+    beats = [x[start:end] for start, end in zip(troughs[:-1], troughs[1:])
+             if end - start > 1]
+    beats = _min_max_rows(scale_pattern_batch(beats, width))
+
+    if template is not None:
+        reference = _min_max_rows(scale_pattern(
+            np.asarray(template, dtype=float), width).reshape(1, -1))[0]
+    elif template_type == 'average':
+        reference = np.zeros(width) if len(beats) == 0 else \
+            _min_max_rows(np.mean(beats, axis=0).reshape(1, -1))[0]
+    elif template_type in [0, 1, 2, 3] and type(template_type) == int:
+        if template_cache is None:
+            template_cache = TEMPLATE_CACHE
+        reference = _min_max_rows(template_cache.get(
+            template_type, width).reshape(1, -1))[0]
+    else:
+        raise ValueError("Invalid template type")
+
+    if len(beats) == 0:
+        scores = np.array([])
+    elif method == 'correlation':
+        beat_dev = beats - beats.mean(axis=1, keepdims=True)
+        reference_dev = reference - reference.mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = beat_dev @ reference_dev / \
+                (np.linalg.norm(beat_dev, axis=1) *
+                 np.linalg.norm(reference_dev))
+    else:
+        window_type = None if window_size is None else 'sakoechiba'
+        match_distance, trace = _dtw_open_asymmetric(
+            beats, reference, window_type, window_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(trace == 0, 1.0, match_distance/trace)
+
+    if len(scores) == 0 or np.all(np.isnan(scores)):
+        summary = {'mean': np.nan, 'median': np.nan, 'std': np.nan,
+                   'min': np.nan}
+    else:
+        summary = {'mean': np.nanmean(scores),
+                   'median': np.nanmedian(scores),
+                   'std': np.nanstd(scores),
+                   'min': np.nanmin(scores)}
+    summary['n_beats'] = len(scores)
+    return summary, scores
+
+
+def _min_max_rows(a):
+    """handy
+    Rows of a scaled to [0, 1], constant rows to 0."""
+    a = np.asarray(a, dtype=float)
+    low = a.min(axis=1, keepdims=True)
+    span = np.ptp(a, axis=1, keepdims=True)
+    return np.divide(a - low, span, out=np.zeros_like(a), where=span > 0)
+
+
+def _window_bounds(n, m, window_type=None, window_size=None):
+    """
+    handy
+    First and last reference index allowed on each query row. dtw-python
+    evaluates the window after prepending the null row of open-begin
+    alignments, i.e. for query rows 1 to n of n + 1.
+    """
+    rows = np.arange(1, n + 1)
+    if window_type is None:
+        lo = np.zeros(n, dtype=int)
+        hi = np.full(n, m - 1)
+    elif window_type == 'sakoechiba':
+        if window_size is None:
+            raise ValueError("window_size is required for 'sakoechiba'")
+        lo = rows - window_size
+        hi = rows + window_size
+    elif window_type == 'itakura':
+        n = n + 1
+        lo = np.maximum(rows // 2, m - 2 * n + 2 * rows + 1)
+        hi = np.minimum(2 * rows, (rows - n + 2 * m) // 2)
+    else:
+        raise ValueError("Invalid window type")
+    return np.maximum(lo, 0), np.minimum(hi, m - 1)
+
+
+def _dtw_open_asymmetric(X, y, window_type=None, window_size=None):
+    """
+    handy
+    Open-begin, open-end DTW of each row of X against y with the asymmetric
+    step pattern (steps (1, 0), (1, 1) and (1, 2), the first of equal costs
+    is taken as in dtw-python).
+
+    Only the step taken into each cell of the window is stored: the
+    accumulated cost along the warping path is the cumulative sum of the
+    local distances on it.
+
+    Parameters
+    ----------
+    X :
+        2-D array, one query per row
+    y :
+        1-D reference
+    window_type :
+        see dtw_sqi
+    window_size :
+        see dtw_sqi
+
+    Returns
+    -------
+    tuple of 1-D numpy array, the sum of the accumulated costs along the
+    warping path and the trace of the accumulated cost matrix
+    """
+    n_rows, n = X.shape
+    y = np.asarray(y, dtype=float)
+    m = len(y)
+    lo, hi = _window_bounds(n, m, window_type, window_size)
+    width = max(int(np.max(hi - lo)) + 1, 1)
+    band = np.arange(width)
+    y_padded = np.append(y, np.full(width, np.nan))
+    steps = np.zeros((n, n_rows, width), dtype=np.int8)
+    diagonal = np.full((n_rows, min(n, m)), np.nan)
+    # previous row with 2 leading and 2 + width trailing inf cells
+    previous = np.full((n_rows, 2 * width + 4), np.inf)
+    for i in range(n):
+        inside = band <= hi[i] - lo[i]
+        shift = lo[i] - lo[i - 1] + 2 if i > 0 else 2
+        if lo[i] > hi[i] or not 2 <= shift <= width + 4:
+            # empty window row, or none of its cells can be reached
+            cost = np.full((n_rows, width), np.inf)
+        else:
+            local = np.abs(X[:, i, None] - y_padded[lo[i]:lo[i] + width])
+            if i == 0:
+                cost = local
+            else:
+                # compared after adding the local distance, which can
+                # round close costs to a tie, as in dtw-python
+                cost = local + previous[:, shift:shift + width]
+                step = np.zeros(cost.shape, dtype=np.int8)
+                for s in [1, 2]:
+                    candidate = local + \
+                        previous[:, shift - s:shift - s + width]
+                    better = candidate < cost
+                    cost[better] = candidate[better]
+                    step[better] = s
+                steps[i] = step
+        cost[:, ~inside] = np.inf
+        if i < m and lo[i] <= i <= hi[i]:
+            diagonal[:, i] = cost[:, i - lo[i]]
+        previous[:, 2:2 + width] = cost
+    last = previous[:, 2:2 + width]
+    if np.any(np.all(np.isinf(last), axis=1)):
+        raise ValueError("No warping path found compatible with the local "
+                         "constraints")
+    # backtracking from the open end, the first minimum of the normalised
+    # costs of the last row as in dtw-python
+    rows = np.arange(n_rows)
+    j = lo[-1] + np.argmin(last / n, axis=1)
+    path = np.empty((n_rows, n), dtype=int)
+    for i in range(n - 1, 0, -1):
+        path[:, i] = j
+        j = j - steps[i, rows, j - lo[i]]
+    path[:, 0] = j
+    match_cost = np.cumsum(np.abs(X - y[path]), axis=1)
+    diagonal[np.isinf(diagonal)] = np.nan
+    return match_cost.sum(axis=1), diagonal.sum(axis=1)
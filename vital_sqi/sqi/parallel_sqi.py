@@ -0,0 +1,145 @@
+"""Scoring the segments of a recording in parallel across cores"""
+import mmap
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None
+
+from vital_sqi.data.signal_sqi_class import SignalSQI
+
+# signal buffer of a worker process, attached once by _init_worker
+_worker_signals = None
+_worker_buffer = None
+
+
+def parallel_sqi(signal_sqi, sqi_func, segment_length, step=None,
+                 n_workers=None, chunk_size=64, batch=False):
+    """Expose
+    Compute SQIs of every equal-length segment of a recording on a process
+    pool, and store them in signal_sqi.sqi_indexes.
+
+    The signal is not pickled per segment: workers memory-map it when it is
+    already a numpy.memmap (e.g. from NPY_reader), and attach to a copy in
+    shared memory otherwise. Segments are sent in work units of chunk_size
+    and the results keep the segment order.
+
+    Parameters
+    ----------
+    signal_sqi :
+        object of class SignalSQI, or array_like signal.
+    sqi_func :
+        callable computing the SQIs of one segment and returning a dict,
+        a list or a number. With batch=True, it gets a 2-D array of
+        segments and returns a pandas.DataFrame with one row per segment,
+        e.g. batch_standard_sqi. It must be picklable, i.e. defined at
+        module level.
+    segment_length :
+        int, number of samples per segment.
+    step :
+        int, number of samples between segment starts.
+        (Default value = None, same as segment_length)
+    n_workers :
+        int, number of worker processes. 0 or 1 computes serially in the
+        current process. (Default value = None, number of CPUs)
+    chunk_size :
+        int, number of segments per work unit. (Default value = 64)
+    batch :
+        bool, whether sqi_func takes a 2-D array of segments.
+        (Default value = False)
+
+    Returns
+    -------
+    pandas.DataFrame
+        one row per segment and one column per SQI. Trailing samples that
+        do not fill a segment are left out.
+
+    """
+    if not isinstance(signal_sqi, SignalSQI):
+        signal_sqi = SignalSQI(signals=np.asanyarray(signal_sqi))
+    if step is None:
+        step = segment_length
+    signals = signal_sqi.signals
+    n_segments = max((len(signals) - segment_length) // step + 1, 0)
+    tasks = [(start, min(start + chunk_size, n_segments), segment_length,
+              step, sqi_func, batch)
+             for start in range(0, n_segments, chunk_size)]
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    if n_workers is None or n_workers <= 1 or len(tasks) <= 1:
+        results = [_score_chunk(signals, *task) for task in tasks]
+    else:
+        results = _run_pool(signals, tasks, n_workers)
+    if len(results) == 0:
+        sqi_indexes = pd.DataFrame()
+    else:
+        sqi_indexes = pd.concat(results, ignore_index=True)
+    signal_sqi.update_sqi_indexes(sqi_indexes)
+    return sqi_indexes
+
+
+def _run_pool(signals, tasks, n_workers):
+    """handy
+    Map the tasks on a process pool sharing the signal buffer."""
+    shm = None
+    if isinstance(signals, np.memmap) and \
+            isinstance(signals.base, mmap.mmap) and \
+            signals.filename is not None:
+        source = ('memmap', signals.filename, signals.offset)
+    elif shared_memory is not None:
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(signals.nbytes, 1))
+        np.ndarray(signals.shape, signals.dtype, buffer=shm.buf)[:] = signals
+        source = ('shm', shm.name, 0)
+    else:
+        return [_score_chunk(signals, *task) for task in tasks]
+    try:
+        with ProcessPoolExecutor(
+                max_workers=n_workers, initializer=_init_worker,
+                initargs=source + (signals.shape, signals.dtype.str)) \
+                as executor:
+            results = list(executor.map(_score_chunk_worker, tasks))
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def _init_worker(kind, name, offset, shape, dtype):
+    """handy
+    Attach the worker process to the shared signal buffer."""
+    global _worker_signals, _worker_buffer
+    if kind == 'memmap':
+        _worker_signals = np.memmap(name, dtype=dtype, mode='r',
+                                    offset=offset, shape=shape)
+    else:
+        _worker_buffer = shared_memory.SharedMemory(name=name)
+        _worker_signals = np.ndarray(shape, dtype, buffer=_worker_buffer.buf)
+
+
+def _score_chunk_worker(task):
+    """handy"""
+    return _score_chunk(_worker_signals, *task)
+
+
+def _score_chunk(signals, first, last, segment_length, step, sqi_func,
+                 batch):
+    """handy
+    SQIs of the segments first to last (excluded) as a DataFrame."""
+    starts = np.arange(first, last) * step
+    if batch:
+        segments = SignalSQI(signals=signals[starts[0]:
+                                             starts[-1] + segment_length])\
+            .get_segments(segment_length, step)
+        return pd.DataFrame(sqi_func(segments)).reset_index(drop=True)
+    rows = []
+    for start in starts:
+        sqis = sqi_func(signals[start:start + segment_length])
+        if np.isscalar(sqis):
+            sqis = {getattr(sqi_func, '__name__', 0): sqis}
+        rows.append(sqis)
+    return pd.DataFrame(rows)
@@ -1,7 +1,10 @@
 """Signal quality indexes based on dynamic template matching"""
 
 import numpy as np
+import pandas as pd
 from scipy.stats import kurtosis, skew, entropy
+from scipy.special import entr
+from vital_sqi.common.rpeak_detection import PeakDetector
 
 """
 Most of the sqi scores are obtained from the following paper Elgendi,
@@ -250,6 +253,115 @@ def mean_crossing_rate_sqi(y, threshold=1e-10, ref_magnitude=None,
                                    pad, zero_pos, axis)
 
 
+BATCH_SQIS = ['perfusion_sqi', 'kurtosis_sqi', 'skewness_sqi', 'entropy_sqi',
+              'signal_to_noise_sqi', 'zero_crossings_rate_sqi',
+              'mean_crossing_rate_sqi']
+
+
+def batch_standard_sqi(segments, sqi_names=None, raw_mean=None,
+                       chunk_size=10000):
+    """Expose
+    Compute several statistical SQIs of many equal-length segments at once.
+    The mean, min/max and centered moments of each segment are computed
+    once and shared by all SQIs, vectorized across segments. Results match
+    the single-segment functions with their default arguments.
+
+    Parameters
+    ----------
+    segments :
+        array_like of shape (n_segments, n_samples), e.g. the output of
+        SignalSQI.get_segments. It may be a view of a numpy.memmap, it is
+        read chunk_size rows at a time.
+    sqi_names :
+        list, names among BATCH_SQIS (Default value = None, all of them)
+    raw_mean :
+        float or array_like of shape (n_segments,), the mean of the raw
+        signal of each segment for perfusion_sqi.
+        (Default value = None, the mean of segments)
+    chunk_size :
+        int, number of segments processed per vectorized pass.
+        (Default value = 10000)
+
+    Returns
+    -------
+    pandas.DataFrame
+        one row per segment and one column per SQI, ready for
+        SignalSQI.update_sqi_indexes.
+
+    """
+    if sqi_names is None:
+        sqi_names = BATCH_SQIS
+    for name in sqi_names:
+        if name not in BATCH_SQIS:
+            raise ValueError("Invalid SQI name: {0}".format(name))
+    if np.ndim(segments) == 1:
+        segments = np.reshape(segments, (1, -1))
+    if np.ndim(segments) != 2:
+        raise ValueError("Expected a 2-D array of segments")
+    n_segments = len(segments)
+    if raw_mean is not None:
+        raw_mean = np.broadcast_to(np.asarray(raw_mean, dtype=float),
+                                   (n_segments,))
+    results = []
+    for start in range(0, n_segments, chunk_size):
+        end = min(start + chunk_size, n_segments)
+        chunk = np.asarray(segments[start:end], dtype=float)
+        chunk_raw_mean = None if raw_mean is None else raw_mean[start:end]
+        results.append(_batch_standard_sqi(chunk, sqi_names, chunk_raw_mean))
+    if len(results) == 0:
+        return pd.DataFrame(columns=sqi_names)
+    return pd.concat(results, ignore_index=True)
+
+
+def _batch_standard_sqi(x, sqi_names, raw_mean):
+    """handy
+    Batch SQIs of one 2-D chunk of segments."""
+    n = x.shape[1]
+    mean = x.mean(axis=1)
+    centered = x - mean[:, None]
+    squared = centered ** 2
+    m2 = squared.mean(axis=1)
+    # same degenerate-variance test as scipy.stats.skew/kurtosis
+    zero_variance = m2 <= (np.finfo(float).resolution * mean) ** 2
+    x_min = x.min(axis=1)
+    x_max = x.max(axis=1)
+    out = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'perfusion_sqi' in sqi_names:
+            if raw_mean is None:
+                raw_mean = mean
+            out['perfusion_sqi'] = (x_max - x_min) / np.abs(raw_mean) * 100
+        if 'kurtosis_sqi' in sqi_names:
+            m4 = (squared ** 2).mean(axis=1)
+            out['kurtosis_sqi'] = np.where(zero_variance, np.nan,
+                                           m4 / m2 ** 2 - 3)
+        if 'skewness_sqi' in sqi_names:
+            m3 = (squared * centered).mean(axis=1)
+            out['skewness_sqi'] = np.where(zero_variance, np.nan,
+                                           m3 / m2 ** 1.5)
+        if 'entropy_sqi' in sqi_names:
+            shifted = x - x_min[:, None]
+            pk = shifted / shifted.sum(axis=1, keepdims=True)
+            out['entropy_sqi'] = entr(pk).sum(axis=1)
+        if 'signal_to_noise_sqi' in sqi_names:
+            sd = np.sqrt(m2)
+            out['signal_to_noise_sqi'] = np.where(sd == 0, 0, mean / sd)
+        if 'zero_crossings_rate_sqi' in sqi_names:
+            out['zero_crossings_rate_sqi'] = _batch_crossing_rate(x, n)
+        if 'mean_crossing_rate_sqi' in sqi_names:
+            out['mean_crossing_rate_sqi'] = _batch_crossing_rate(centered, n)
+    return pd.DataFrame(out, columns=sqi_names)
+
+
+def _batch_crossing_rate(y, n, threshold=1e-10):
+    """handy
+    zero_crossings_rate_sqi with default arguments along the rows of y."""
+    y_sign = np.signbit(np.where(np.abs(y) <= threshold, 0, y))
+    crossings = np.count_nonzero(y_sign[:, 1:] != y_sign[:, :-1], axis=1)
+    # the first sample is padded as a crossing
+    return (crossings + 1) / n
+
+
 def msq_sqi(y, peak_detect1=7, peak_detect2=6):
     """
     MSQ SQI as defined in Elgendi et al "Optimal Signal Quality Index for Photoplethysmogram Signals" 